@@ -1,11 +1,42 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from supabase import create_client, Client
-import os
 from django.conf import settings
 from django.contrib.auth.models import User
+import logging
+
+from common.clients import get_supabase_client
+from .principals import Principal, cache_principal, get_cached_principal, principal_version
+from .tokens import (
+    TokenVerificationError,
+    VerificationUnavailable,
+    verify_token,
+    verify_token_remote,
+)
+
+logger = logging.getLogger(__name__)
 
 class SupabaseAuthentication(BaseAuthentication):
+    def verify(self, token, supabase):
+        """
+        Verify the token locally (no network) and only call Supabase Auth
+        when local verification is disabled or, if SUPABASE_JWT_REMOTE_FALLBACK
+        is enabled, when the signing key is not available locally.
+        """
+        if settings.SUPABASE_JWT_VERIFICATION == 'local':
+            try:
+                return verify_token(token)
+            except VerificationUnavailable as e:
+                if not settings.SUPABASE_JWT_REMOTE_FALLBACK:
+                    raise AuthenticationFailed(f'Token validation error: {str(e)}')
+                logger.warning("Local token verification unavailable, falling back to Supabase: %s", e)
+            except TokenVerificationError as e:
+                raise AuthenticationFailed(f'Invalid token: {str(e)}')
+
+        try:
+            return verify_token_remote(supabase, token)
+        except TokenVerificationError as e:
+            raise AuthenticationFailed(str(e))
+
     def authenticate(self, request):
         auth_header = request.headers.get('Authorization')
         if not auth_header:
@@ -16,83 +47,112 @@ class SupabaseAuthentication(BaseAuthentication):
         except IndexError:
             raise AuthenticationFailed('Token prefix missing')
 
-        url: str = os.environ.get("SUPABASE_URL", "")
-        key: str = os.environ.get("SUPABASE_KEY", "")
-        
-        if not url or not key:
+        return self.authenticate_token(request, token)
+
+    def authenticate_token(self, request, token):
+        """Authenticate `request` with a bearer token however it was sent."""
+        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
              # Fail open or closed depending on preference, but for now specific error
              raise AuthenticationFailed('Server misconfiguration: Supabase credentials missing')
         
-        supabase: Client = create_client(url, key)
+        # Shared across requests and threads: never mutate its auth state
+        supabase = get_supabase_client()
 
         try:
-            user_data = supabase.auth.get_user(token)
-            if not user_data or not user_data.user:
-                raise AuthenticationFailed('Invalid token')
+            verified = self.verify(token, supabase)
             
-            # Get email from Supabase user
-            email = user_data.user.email
-            supabase_user_id = user_data.user.id
+            # Get email from the verified token
+            email = verified.email
+            supabase_user_id = verified.user_id
+            if not email:
+                # Local users are keyed by email: never map a token to username=''
+                raise AuthenticationFailed('Token has no email')
             
-            # Get or create local user to map to Django's auth system
-            # We use the email as username since Supabase guarantees uniqueness there usually
-            user, created = User.objects.get_or_create(username=email, defaults={'email': email})
+            # Identity resolved by a recent request: no DB query, no remote call
+            principal = get_cached_principal(supabase_user_id)
+            if principal is None:
+                # Read first: a profile change committed while resolving makes the entry stale
+                version = principal_version(supabase_user_id)
+                principal, cacheable = self.resolve_principal(token, email, supabase_user_id, supabase)
+                if cacheable:
+                    cache_principal(supabase_user_id, principal, version, expires_at=verified.expires_at)
             
-            # Fetch extra profile info from Supabase 'profiles' table
-            try:
-                # IMPORTANT: We must authenticate the request to bypass RLS policies
-                # that restrict access to "own profile only".
-                supabase.postgrest.auth(token)
-                profile_res = supabase.table('profiles').select('*').eq('id', supabase_user_id).single().execute()
-                
-                if profile_res.data:
-                    user.company = profile_res.data.get('company')
-                    user.role = profile_res.data.get('role')
-                else:
-                    # If data is empty (no permissions found or RLS blocking)
-                    print(f"No profile found for user {email}")
-                    user.company = None
-                    user.role = None
-            except Exception as profile_err:
-                print(f"Profile fetch error for {email}: {profile_err}")
+            # Also attaches user_id for convenience
+            principal.attach(request, supabase_user_id)
+            
+            return (principal.get_user(), None)
+            
+        except AuthenticationFailed:
+            raise
+        except Exception as e:
+            raise AuthenticationFailed(f'Token validation error: {str(e)}')
+
+    def resolve_principal(self, token, email, supabase_user_id, supabase):
+        """
+        Build the principal from the local DB and the Supabase profile.
+        Returns (principal, cacheable); lookups that failed unexpectedly make
+        the result non-cacheable so a transient error is not remembered.
+        """
+        cacheable = True
+        
+        # Get or create local user to map to Django's auth system
+        # We use the email as username since Supabase guarantees uniqueness there usually
+        user, created = User.objects.get_or_create(username=email, defaults={'email': email})
+        
+        # Fetch extra profile info from Supabase 'profiles' table
+        try:
+            # IMPORTANT: We must authenticate the request to bypass RLS policies
+            # that restrict access to "own profile only". The token is set on
+            # this query only, the pooled client is shared with other requests.
+            profiles = supabase.table('profiles')
+            profiles.headers = profiles.headers.copy()
+            profiles.headers['Authorization'] = f'Bearer {token}'
+            profile_res = profiles.select('*').eq('id', supabase_user_id).single().execute()
+            
+            if profile_res.data:
+                user.company = profile_res.data.get('company')
+                user.role = profile_res.data.get('role')
+            else:
+                # If data is empty (no permissions found or RLS blocking)
+                print(f"No profile found for user {email}")
                 user.company = None
                 user.role = None
+        except Exception as profile_err:
+            print(f"Profile fetch error for {email}: {profile_err}")
+            user.company = None
+            user.role = None
+            cacheable = False
+        
+        # Fetch UserProfile from local database for permissions
+        try:
+            from users.models import UserProfile
+            user_profile = UserProfile.objects.get(supabase_user_id=supabase_user_id)
             
-            # Fetch UserProfile from local database for permissions
-            try:
-                from users.models import UserProfile
-                user_profile = UserProfile.objects.get(supabase_user_id=supabase_user_id)
-                
-                # Attach permissions to request for easy access in views
-                request.user_profile = user_profile
-                request.user_role = user_profile.role
-                request.user_company = user_profile.company
-                request.user_permissions = {
+            principal = Principal(
+                user=user,
+                user_profile=user_profile,
+                role=user_profile.role,
+                company=user_profile.company,
+                permissions={
                     'can_view_reports': user_profile.can_view_reports,
                     'can_view_user_management': user_profile.can_view_user_management,
-                }
-            except UserProfile.DoesNotExist:
-                # User exists in Supabase but not in local DB
-                # This is okay for now, they just won't have extended permissions
-                request.user_profile = None
-                request.user_role = getattr(user, 'role', None)
-                request.user_company = getattr(user, 'company', None)
-                request.user_permissions = {
+                },
+            )
+        except UserProfile.DoesNotExist:
+            # User exists in Supabase but not in local DB
+            # This is okay for now, they just won't have extended permissions
+            principal = Principal(
+                user=user,
+                role=getattr(user, 'role', None),
+                company=getattr(user, 'company', None),
+                permissions={
                     'can_view_reports': False,
                     'can_view_user_management': False,
-                }
-            except Exception as e:
-                print(f"Error fetching UserProfile: {e}")
-                request.user_profile = None
-                request.user_role = None
-                request.user_company = None
-                request.user_permissions = {}
-            
-            # Also attach user_id for convenience
-            request.user_id = supabase_user_id
-            
-            return (user, None)
-            
+                },
+            )
         except Exception as e:
-            raise AuthenticationFailed(f'Token validation error: {str(e)}')
-
+            print(f"Error fetching UserProfile: {e}")
+            principal = Principal(user=user)
+            cacheable = False
+        
+        return principal, cacheable
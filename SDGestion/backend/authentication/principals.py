@@ -0,0 +1,96 @@
+"""
+Cache of resolved principals.
+
+Resolving who a request belongs to takes a `User.objects.get_or_create`,
+a Supabase `profiles` select and a `UserProfile` lookup. The result is
+cached per Supabase user id for AUTH_PRINCIPAL_CACHE_TTL seconds, never
+beyond the expiry of the token that resolved it, so steady-state requests
+do no DB queries and no remote calls for identity.
+
+The cache is per process. Each entry remembers the user's version stamp
+(common.caching.get_stamp, kept in the Django cache) read before it was
+resolved; `invalidate_principal` replaces the stamp after a UserProfile
+change commits (see `users/signals.py`). A hit compares stamps, a cache
+lookup and no DB query, so with a shared cache backend a change made
+through another gunicorn worker is seen on the next request; with the
+default LocMemCache, when the entry expires.
+"""
+import copy
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from common.caching import TTLCache, bump_stamp, get_stamp
+
+
+@dataclass(frozen=True)
+class Principal:
+    user: User
+    user_profile: object = None
+    role: str | None = None
+    company: str | None = None
+    permissions: dict = field(default_factory=dict)
+
+    def attach(self, request, supabase_user_id):
+        """Attach permissions to request for easy access in views"""
+        request.user_profile = self.user_profile
+        request.user_role = self.role
+        request.user_company = self.company
+        request.user_permissions = dict(self.permissions)
+        request.user_id = supabase_user_id
+
+    def get_user(self):
+        # Each request gets its own copy, the cached instance is shared
+        return copy.copy(self.user)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_principal_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTLCache(
+                    maxsize=settings.AUTH_PRINCIPAL_CACHE_SIZE,
+                    ttl=settings.AUTH_PRINCIPAL_CACHE_TTL,
+                )
+    return _cache
+
+
+def principal_version(supabase_user_id):
+    """Version stamp to read before resolving a principal and cache it with."""
+    return get_stamp(f'principal-version:{supabase_user_id}')
+
+
+def get_cached_principal(supabase_user_id):
+    entry = get_principal_cache().get(supabase_user_id)
+    if entry is None:
+        return None
+    version, principal = entry
+    if version != principal_version(supabase_user_id):
+        # Changed (or created, or deleted) since it was cached, possibly by another worker
+        get_principal_cache().delete(supabase_user_id)
+        return None
+    return principal
+
+
+def cache_principal(supabase_user_id, principal, version, expires_at=None):
+    ttl = settings.AUTH_PRINCIPAL_CACHE_TTL
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    get_principal_cache().set(supabase_user_id, (version, principal), ttl=ttl)
+
+
+def invalidate_principal(supabase_user_id):
+    get_principal_cache().delete(supabase_user_id)
+    bump_stamp(f'principal-version:{supabase_user_id}')
+
+
+def clear_principals():
+    get_principal_cache().clear()
@@ -0,0 +1,208 @@
+"""
+Verification of Supabase access tokens.
+
+Tokens are verified locally whenever possible: HS256 tokens against the
+project's JWT secret and asymmetric tokens (RS256/ES256) against the
+project's JWKS document, which is cached in memory and refreshed in a
+background thread. A remote call to Supabase Auth (`auth.get_user`) is only
+used when local verification is disabled or, if configured, when the key
+material needed to verify a token locally is not available.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+
+import jwt
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
+
+class TokenVerificationError(Exception):
+    """The token is invalid (bad signature, expired, wrong audience...)."""
+
+
+class VerificationUnavailable(TokenVerificationError):
+    """The token could not be verified locally because key material is missing."""
+
+
+@dataclass(frozen=True)
+class VerifiedToken:
+    user_id: str
+    email: str
+    expires_at: float | None = None
+    claims: dict = field(default_factory=dict)
+
+
+class JWKSCache:
+    """
+    In-memory cache of the project's JSON Web Key Set.
+
+    Keys are refreshed every `refresh_interval` seconds by a daemon thread.
+    A token signed with an unknown `kid` triggers an immediate refresh
+    (at most once every `min_refresh_interval` seconds) so that key rotation
+    is picked up without waiting for the next scheduled refresh. A failed
+    fetch is not retried for `min_refresh_interval` seconds.
+    """
+
+    def __init__(self, url, refresh_interval=600, min_refresh_interval=30, timeout=5):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _fetch(self):
+        request = urllib.request.Request(self.url, headers={'Accept': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            document = json.load(response)
+
+        keys = {}
+        for jwk in document.get('keys', []):
+            try:
+                keys[jwk.get('kid')] = jwt.PyJWK(jwk)
+            except jwt.PyJWTError as e:
+                logger.warning("Skipping unusable JWK %s: %s", jwk.get('kid'), e)
+        return keys
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            # After a failure even forced refreshes back off, or every request
+            # would wait for the fetch timeout while the JWKS endpoint is down
+            if self._failed_at is not None and now - self._failed_at < self.min_refresh_interval:
+                return
+            if not force and now - self._fetched_at < self.min_refresh_interval:
+                return
+            try:
+                keys = self._fetch()
+            except Exception as e:
+                logger.warning("Could not refresh JWKS from %s: %s", self.url, e)
+                # Keep the old keys
+                self._failed_at = time.monotonic()
+                return
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._failed_at = None
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh(force=True)
+
+    def _ensure_background_refresh(self):
+        # Threads do not survive fork(), so each gunicorn worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._refresh_loop, name='jwks-refresh', daemon=True
+            )
+            self._thread.start()
+
+    def get_signing_key(self, kid):
+        self._ensure_background_refresh()
+        if not self._keys:
+            self.refresh(force=True)
+
+        key = self._keys.get(kid)
+        if key is None:
+            # Unknown kid: the signing key may have been rotated
+            self.refresh()
+            key = self._keys.get(kid)
+        if key is None:
+            raise VerificationUnavailable(f"No JWKS key found for kid '{kid}'")
+        return key
+
+
+_jwks_cache = None
+_jwks_lock = threading.Lock()
+
+
+def get_jwks_cache():
+    global _jwks_cache
+    if _jwks_cache is None:
+        with _jwks_lock:
+            if _jwks_cache is None:
+                _jwks_cache = JWKSCache(
+                    settings.SUPABASE_JWKS_URL,
+                    refresh_interval=settings.SUPABASE_JWKS_REFRESH_INTERVAL,
+                )
+    return _jwks_cache
+
+
+def verify_token(token):
+    """Verify a Supabase access token locally and return its identity."""
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError as e:
+        raise TokenVerificationError(f"Malformed token: {e}")
+
+    algorithm = header.get('alg')
+    if algorithm == 'HS256':
+        if not settings.SUPABASE_JWT_SECRET:
+            raise VerificationUnavailable("SUPABASE_JWT_SECRET is not configured")
+        key = settings.SUPABASE_JWT_SECRET
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        if not settings.SUPABASE_JWKS_URL:
+            raise VerificationUnavailable("SUPABASE_JWKS_URL is not configured")
+        jwk = get_jwks_cache().get_signing_key(header.get('kid'))
+        # Never let the token header pick an algorithm the key was not issued for
+        if jwk.algorithm_name != algorithm:
+            raise TokenVerificationError("Token algorithm does not match signing key")
+        key = jwk.key
+    else:
+        raise TokenVerificationError(f"Unsupported token algorithm: {algorithm}")
+
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.SUPABASE_JWT_AUDIENCE or None,
+            issuer=settings.SUPABASE_JWT_ISSUER or None,
+            leeway=settings.SUPABASE_JWT_LEEWAY,
+            options={
+                'require': ['exp', 'sub'],
+                'verify_aud': bool(settings.SUPABASE_JWT_AUDIENCE),
+            },
+        )
+    except jwt.PyJWTError as e:
+        raise TokenVerificationError(str(e))
+
+    return VerifiedToken(
+        user_id=claims['sub'],
+        email=claims.get('email', ''),
+        expires_at=claims.get('exp'),
+        claims=claims,
+    )
+
+
+def verify_token_remote(supabase, token):
+    """Verify a token by asking Supabase Auth (one HTTP round trip)."""
+    user_data = supabase.auth.get_user(token)
+    if not user_data or not user_data.user:
+        raise TokenVerificationError('Invalid token')
+
+    # Supabase already validated the token, we only read its expiry
+    claims = jwt.decode(token, options={'verify_signature': False})
+    return VerifiedToken(
+        user_id=user_data.user.id,
+        email=user_data.user.email,
+        expires_at=claims.get('exp'),
+        claims=claims,
+    )
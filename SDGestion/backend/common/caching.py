@@ -0,0 +1,85 @@
+"""
+Small in-process caches shared by the apps, and the version stamps that
+tell them apart across processes.
+
+A stamp is a random token kept in the Django cache. Writers replace it
+(`bump_stamp`) when the data behind an in-process cache changes; readers
+remember the stamp an entry was built from and rebuild it when the
+current one (`get_stamp`) differs. A stamp that was evicted or never set
+is replaced by a new token, so losing one can only cause a rebuild. With
+a shared cache backend a change made by one gunicorn worker is seen by
+all of them; with the default per-process LocMemCache only by the worker
+that made it, the others catching up when their entries expire.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+
+    Each entry can carry its own TTL (e.g. capped at a token's expiry);
+    when the cache is full the least recently used entry is evicted.
+    The cache lives in the process memory, so every gunicorn worker has
+    its own copy.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_stamp(key):
+    """Current version stamp for `key` (a cache lookup, never a DB query)."""
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        stamp = cache.get(key)
+    return stamp
+
+
+def bump_stamp(key):
+    """Mark the data behind `key` as changed, for every process sharing the cache."""
+    cache.set(key, uuid.uuid4().hex, timeout=None)
@@ -0,0 +1,150 @@
+"""
+Process-wide registry of external service clients (Supabase, S3).
+
+Clients are created lazily on first use and then shared by every request
+handled by the process, so HTTP sessions, TLS connections and botocore
+service models are reused instead of being rebuilt per request. boto3
+clients and httpx clients are thread-safe once constructed; construction
+itself is serialized here.
+
+The registry is fork-aware: a gunicorn worker forked from a parent that
+already built clients gets fresh ones instead of sharing sockets.
+
+Tests can swap in stubs with `set_client()` and drop everything with
+`reset_clients()`; the registry is also reset whenever a setting changes
+(e.g. under `override_settings`).
+"""
+import os
+import threading
+
+import boto3
+import httpx
+from botocore.config import Config
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from supabase import create_client
+from supabase.lib.client_options import SyncClientOptions
+from supabase_auth import SyncMemoryStorage
+
+S3 = 's3'
+SUPABASE = 'supabase'
+SUPABASE_ADMIN = 'supabase_admin'
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._clients = {}
+                    self._pid = os.getpid()
+
+    def get(self, name, factory):
+        self._check_fork()
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = factory()
+                    self._clients[name] = client
+        return client
+
+    def set(self, name, client):
+        self._check_fork()
+        with self._lock:
+            self._clients[name] = client
+
+    def reset(self):
+        with self._lock:
+            self._clients = {}
+            self._pid = os.getpid()
+
+
+registry = ClientRegistry()
+
+
+def _build_s3_client():
+    config = Config(
+        max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_S3_READ_TIMEOUT,
+        tcp_keepalive=True,
+        retries={
+            'max_attempts': settings.AWS_S3_MAX_ATTEMPTS,
+            'mode': settings.AWS_S3_RETRY_MODE,
+        },
+    )
+    # A private session: the default boto3 session is not thread-safe
+    session = boto3.session.Session()
+    return session.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        config=config,
+    )
+
+
+def _build_supabase_client(key):
+    if not settings.SUPABASE_URL or not key:
+        raise ImproperlyConfigured('Supabase credentials missing')
+
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(
+            settings.SUPABASE_HTTP_TIMEOUT,
+            connect=settings.SUPABASE_HTTP_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        # Retries connection errors only, requests are never replayed
+        transport=httpx.HTTPTransport(retries=settings.SUPABASE_HTTP_RETRIES),
+        follow_redirects=True,
+    )
+    options = SyncClientOptions(
+        # Server-side clients never hold a user session
+        auto_refresh_token=False,
+        persist_session=False,
+        storage=SyncMemoryStorage(),
+        httpx_client=http_client,
+    )
+    return create_client(settings.SUPABASE_URL, key, options)
+
+
+def get_s3_client():
+    return registry.get(S3, _build_s3_client)
+
+
+def get_supabase_client():
+    """Client authenticated with the public (anon) key."""
+    return registry.get(SUPABASE, lambda: _build_supabase_client(settings.SUPABASE_KEY))
+
+
+def get_supabase_admin_client():
+    """Client authenticated with the service role key (bypasses RLS)."""
+    return registry.get(SUPABASE_ADMIN, lambda: _build_supabase_client(settings.SUPABASE_SERVICE_ROLE_KEY))
+
+
+def set_client(name, client):
+    registry.set(name, client)
+
+
+def reset_clients():
+    registry.reset()
+
+
+def _reset_on_setting_changed(**kwargs):
+    reset_clients()
+
+
+setting_changed.connect(_reset_on_setting_changed)
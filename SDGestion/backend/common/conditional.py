@@ -0,0 +1,28 @@
+"""
+Conditional GET helpers (ETag / If-None-Match / Last-Modified).
+
+Views compute a cheap version fingerprint first and return 304 Not
+Modified before building the response body when the client already has
+the current version.
+"""
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def not_modified(request, etag, last_modified=None):
+    """304 response if the client's validators match, else None"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Content depends on the caller: private, and revalidated on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
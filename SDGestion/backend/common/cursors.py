@@ -0,0 +1,29 @@
+"""
+Opaque pagination cursors.
+
+A cursor is a small JSON document encoded as URL-safe base64. Clients must
+treat it as opaque and send it back unchanged.
+"""
+import base64
+import binascii
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(data, dict):
+        raise InvalidCursor('Invalid cursor')
+    return data
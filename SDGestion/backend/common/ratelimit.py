@@ -0,0 +1,34 @@
+"""
+Client-side rate limiting of calls to external services.
+
+`RateLimiter` is a thread-safe token bucket: up to `burst` calls may go
+through at once, then `rate` calls per second. Threads calling `acquire`
+block until their turn, so a pool of workers sharing one limiter never
+exceeds the rate whatever its size.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,96 @@
+"""
+Request coalescing ("single-flight").
+
+Concurrent calls with the same key wait for one in-flight computation and
+share its result instead of each repeating it.
+
+Within a process, callers wait on a threading.Event. Across processes
+(gunicorn workers), the first caller takes a lock in the Django cache;
+callers in other workers poll the cache for the result it publishes.
+With the default per-process LocMemCache only the in-process part applies.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+_local = SingleFlight()
+
+
+def _shared_do(key, fn, timeout, poll_interval):
+    lock_key = f'singleflight:{key}:lock'
+    result_key = f'singleflight:{key}:result'
+    arrived_at = time.time()
+    token = uuid.uuid4().hex
+
+    deadline = time.monotonic() + timeout
+    while not cache.add(lock_key, token, timeout=timeout):
+        # Another worker is computing: wait for a result it finished after we arrived
+        entry = cache.get(result_key)
+        if entry is not None and entry['finished_at'] >= arrived_at:
+            return entry['result']
+        if time.monotonic() >= deadline:
+            # The other worker is too slow or died: compute it ourselves
+            return fn()
+        time.sleep(poll_interval)
+
+    try:
+        # The previous holder may have published its result just before releasing the lock
+        entry = cache.get(result_key)
+        if entry is not None and entry['finished_at'] >= arrived_at:
+            return entry['result']
+
+        result = fn()
+        cache.set(result_key, {'result': result, 'finished_at': time.time()}, timeout=timeout)
+        return result
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def single_flight(key, fn, timeout=30, poll_interval=0.05):
+    """
+    Run `fn()` once for all concurrent callers of `key` (in this process and,
+    through the cache, in other workers) and return its result to all of them.
+    """
+    return _local.do(key, lambda: _shared_do(key, fn, timeout, poll_interval))
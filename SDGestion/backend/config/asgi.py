@@ -0,0 +1,33 @@
+"""
+ASGI entry point of the report events server (`uvicorn config.asgi:application`).
+
+Only the Server-Sent Events stream is served here: every connection is a
+coroutine, so thousands of idle clients cost no threads. Everything else
+(streamed listings, ZIP downloads, disk-cached files, the sync DRF views)
+is served by the WSGI app (config/wsgi.py) under gunicorn gthread
+workers, where streaming responses are sent chunk by chunk and slow
+requests only hold their own thread.
+"""
+import json
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+django_application = get_asgi_application()
+
+EVENT_PATHS = ('/api/reports/stream/',)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] not in EVENT_PATHS:
+        body = json.dumps({"error": "Only the report event stream is served here"}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': 404,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        return
+    await django_application(scope, receive, send)
@@ -0,0 +1,38 @@
+"""
+gunicorn settings (`gunicorn -c config/gunicorn.conf.py config.wsgi:application`).
+
+Threaded workers: streaming responses (listings, ZIP archives, files sent
+with sendfile) are written as they are produced and a slow request only
+holds its own thread. The SSE stream is served by the separate ASGI
+process (config/asgi.py).
+
+With REPORTS_WARM_ON_START=True each worker warms its report caches
+(clients, access indexes, listings) in the background right after it
+starts, instead of on the first requests it serves.
+"""
+import os
+import threading
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+
+def post_worker_init(worker):
+    if os.environ.get('REPORTS_WARM_ON_START', 'False') != 'True':
+        return
+
+    def warm():
+        from django.db import connections
+        from reports.warmup import warm_caches
+
+        try:
+            warm_caches(log=worker.log.info)
+        except Exception:
+            worker.log.exception("Report cache warm-up failed")
+        finally:
+            connections.close_all()
+
+    # Do not delay accepting requests: they fall back to cold caches meanwhile
+    threading.Thread(target=warm, name='report-warmup', daemon=True).start()
@@ -79,6 +79,17 @@ DATABASES = {
 }
 
 
+# Cache
+# Per-process memory by default; point it at a shared backend (e.g. DatabaseCache after
+# `manage.py createcachetable`, or Redis) to share report listings and locks across gunicorn workers
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 auth_pass_validators = [
     'UserAttributeSimilarityValidator',
@@ -114,9 +125,105 @@ REST_FRAMEWORK = {
 
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True  # For dev only
+# Let the frontend read the validators it sends back in If-None-Match/If-Modified-Since
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified', 'X-Reports-Cursor', 'X-Next-Cursor', 'Link']
 
 # AWS S3
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME')
+# S3-compatible stand-in for local runs and tests (MinIO, moto server), e.g. http://localhost:9000
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL') or None
+# Shared S3 client (see common/clients.py): connection pool, timeouts and retry policy
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_S3_MAX_POOL_CONNECTIONS', '50'))
+AWS_S3_CONNECT_TIMEOUT = float(os.environ.get('AWS_S3_CONNECT_TIMEOUT', '5'))
+AWS_S3_READ_TIMEOUT = float(os.environ.get('AWS_S3_READ_TIMEOUT', '30'))
+AWS_S3_MAX_ATTEMPTS = int(os.environ.get('AWS_S3_MAX_ATTEMPTS', '3'))
+AWS_S3_RETRY_MODE = os.environ.get('AWS_S3_RETRY_MODE', 'standard')
+
+# Supabase
+SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
+SUPABASE_KEY = os.environ.get('SUPABASE_KEY', '')
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
+# Shared Supabase clients (see common/clients.py): connection pool, timeouts and retries
+SUPABASE_HTTP_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_TIMEOUT', '10'))
+SUPABASE_HTTP_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_CONNECT_TIMEOUT', '5'))
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_HTTP_MAX_CONNECTIONS', '50'))
+SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_HTTP_KEEPALIVE_EXPIRY', '30'))
+SUPABASE_HTTP_RETRIES = int(os.environ.get('SUPABASE_HTTP_RETRIES', '2'))
+
+# Supabase token verification
+# 'local' verifies JWTs in-process (JWT secret or JWKS), 'remote' calls Supabase Auth on every request
+SUPABASE_JWT_VERIFICATION = os.environ.get('SUPABASE_JWT_VERIFICATION', 'local')
+# Call Supabase Auth when a token cannot be verified locally (missing secret, unreachable JWKS)
+SUPABASE_JWT_REMOTE_FALLBACK = os.environ.get('SUPABASE_JWT_REMOTE_FALLBACK', 'False') == 'True'
+SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET', '')
+SUPABASE_JWT_AUDIENCE = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+SUPABASE_JWT_ISSUER = os.environ.get('SUPABASE_JWT_ISSUER', f"{SUPABASE_URL.rstrip('/')}/auth/v1" if SUPABASE_URL else '')
+SUPABASE_JWT_LEEWAY = int(os.environ.get('SUPABASE_JWT_LEEWAY', '10'))
+SUPABASE_JWKS_URL = os.environ.get('SUPABASE_JWKS_URL', f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else '')
+SUPABASE_JWKS_REFRESH_INTERVAL = int(os.environ.get('SUPABASE_JWKS_REFRESH_INTERVAL', '600'))
+
+# Resolved principals (user + profiles) cached per Supabase user id, capped at token expiry
+AUTH_PRINCIPAL_CACHE_TTL = int(os.environ.get('AUTH_PRINCIPAL_CACHE_TTL', '60'))
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.environ.get('AUTH_PRINCIPAL_CACHE_SIZE', '10000'))
+
+# Report listing
+# Folders are listed concurrently on a per-process pool; slower folders are reported with an "error"
+REPORTS_LIST_MAX_WORKERS = int(os.environ.get('REPORTS_LIST_MAX_WORKERS', '16'))
+REPORTS_LIST_TIMEOUT = float(os.environ.get('REPORTS_LIST_TIMEOUT', '20'))
+# S3 listings cached per prefix; stale entries are served while one background refresh runs
+REPORTS_LIST_CACHE_TTL = int(os.environ.get('REPORTS_LIST_CACHE_TTL', '60'))
+REPORTS_LIST_CACHE_STALE = int(os.environ.get('REPORTS_LIST_CACHE_STALE', '600'))
+# Paginated file listing (api/reports/files/), S3 returns at most 1000 keys per call
+REPORTS_PAGE_SIZE = int(os.environ.get('REPORTS_PAGE_SIZE', '100'))
+REPORTS_MAX_PAGE_SIZE = int(os.environ.get('REPORTS_MAX_PAGE_SIZE', '1000'))
+# Paginated user list (api/users/)
+USERS_PAGE_SIZE = int(os.environ.get('USERS_PAGE_SIZE', '100'))
+USERS_MAX_PAGE_SIZE = int(os.environ.get('USERS_MAX_PAGE_SIZE', '500'))
+# Bulk user import (api/users/import/): rows per request, concurrent Supabase calls and calls per second
+USERS_IMPORT_MAX_ROWS = int(os.environ.get('USERS_IMPORT_MAX_ROWS', '1000'))
+USERS_IMPORT_WORKERS = int(os.environ.get('USERS_IMPORT_WORKERS', '8'))
+USERS_IMPORT_RATE = float(os.environ.get('USERS_IMPORT_RATE', '10'))
+# Bulk user update (api/users/bulk/): users per request
+USERS_BULK_UPDATE_MAX_ROWS = int(os.environ.get('USERS_BULK_UPDATE_MAX_ROWS', '1000'))
+# 'index' serves listings from the ReportObject table (kept in sync by `manage.py sync_reports`), 's3' lists S3 live
+REPORTS_LIST_SOURCE = os.environ.get('REPORTS_LIST_SOURCE', 'index')
+# Shared secret of the S3 event ingestion endpoint (api/reports/events/), disabled when empty
+REPORTS_EVENTS_TOKEN = os.environ.get('REPORTS_EVENTS_TOKEN', '')
+# Presigned download URLs: issued URLs are reused until less than MIN_REMAINING seconds are left
+REPORTS_PRESIGN_EXPIRES = int(os.environ.get('REPORTS_PRESIGN_EXPIRES', '3600'))
+REPORTS_PRESIGN_MIN_REMAINING = int(os.environ.get('REPORTS_PRESIGN_MIN_REMAINING', '900'))
+REPORTS_PRESIGN_CACHE_SIZE = int(os.environ.get('REPORTS_PRESIGN_CACHE_SIZE', '10000'))
+REPORTS_PRESIGN_BATCH_MAX = int(os.environ.get('REPORTS_PRESIGN_BATCH_MAX', '200'))
+# Per-(company, role) prefix tries used to authorize listings and downloads, rebuilt when a folder changes (version stamp in the Django cache; with LocMemCache other workers catch up after the TTL)
+REPORTS_ACL_TTL = int(os.environ.get('REPORTS_ACL_TTL', '300'))
+# Stream ReportListView responses by default (clients can always ask with ?stream=1)
+REPORTS_LIST_STREAM = os.environ.get('REPORTS_LIST_STREAM', 'False') == 'True'
+# ZIP downloads (api/reports/download/zip/): memory per download is about BUFFER_CHUNKS x CHUNK_SIZE
+REPORTS_ZIP_MAX_FILES = int(os.environ.get('REPORTS_ZIP_MAX_FILES', '1000'))
+REPORTS_ZIP_CHUNK_SIZE = int(os.environ.get('REPORTS_ZIP_CHUNK_SIZE', str(256 * 1024)))
+REPORTS_ZIP_BUFFER_CHUNKS = int(os.environ.get('REPORTS_ZIP_BUFFER_CHUNKS', '16'))
+# CSV/XLSX previews (api/reports/preview/), read with ranged GETs and cached per object version
+REPORTS_PREVIEW_ROWS = int(os.environ.get('REPORTS_PREVIEW_ROWS', '50'))
+REPORTS_PREVIEW_MAX_ROWS = int(os.environ.get('REPORTS_PREVIEW_MAX_ROWS', '500'))
+REPORTS_PREVIEW_MAX_BYTES = int(os.environ.get('REPORTS_PREVIEW_MAX_BYTES', str(2 * 1024 * 1024)))
+REPORTS_PREVIEW_CACHE_TTL = int(os.environ.get('REPORTS_PREVIEW_CACHE_TTL', '86400'))
+# Proxy downloads through a local LRU disk cache (api/reports/download/file/) instead of handing out S3 URLs
+REPORTS_PROXY_DOWNLOADS = os.environ.get('REPORTS_PROXY_DOWNLOADS', 'False') == 'True'
+REPORTS_DISK_CACHE_DIR = os.environ.get('REPORTS_DISK_CACHE_DIR', '/tmp/report-cache')
+REPORTS_DISK_CACHE_MAX_BYTES = int(os.environ.get('REPORTS_DISK_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+REPORTS_DISK_CACHE_MAX_OBJECT_BYTES = int(os.environ.get('REPORTS_DISK_CACHE_MAX_OBJECT_BYTES', str(100 * 1024 ** 2)))
+# Cached copies are checked against S3 (conditional GET) at most this often
+REPORTS_DISK_CACHE_REVALIDATE = int(os.environ.get('REPORTS_DISK_CACHE_REVALIDATE', '30'))
+# Delta API (api/reports/changes/): changes older than RETENTION seconds are pruned by sync_reports
+REPORTS_CHANGES_RETENTION = int(os.environ.get('REPORTS_CHANGES_RETENTION', str(7 * 24 * 3600)))
+REPORTS_CHANGES_PAGE_SIZE = int(os.environ.get('REPORTS_CHANGES_PAGE_SIZE', '1000'))
+# Server-Sent Events (api/reports/stream/, ASGI events process): one change-log poll per process feeds every connection
+REPORTS_SSE_POLL_INTERVAL = float(os.environ.get('REPORTS_SSE_POLL_INTERVAL', '2'))
+REPORTS_SSE_KEEPALIVE = float(os.environ.get('REPORTS_SSE_KEEPALIVE', '15'))
+# Connections are closed after MAX_AGE seconds (EventSource reconnects) so ACL changes are picked up
+REPORTS_SSE_MAX_AGE = float(os.environ.get('REPORTS_SSE_MAX_AGE', '3600'))
+REPORTS_SSE_QUEUE_SIZE = int(os.environ.get('REPORTS_SSE_QUEUE_SIZE', '1000'))
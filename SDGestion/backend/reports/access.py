@@ -0,0 +1,98 @@
+"""
+Authorization index for report folders and keys.
+
+For each (company, role) the visible ReportFolders are loaded once and
+their S3 prefixes stored in a character trie, so deciding whether a key
+may be downloaded is a walk of at most len(key) nodes with no DB query.
+The listing and download endpoints both go through this index, so a user
+can download exactly the keys under the folders they can list.
+
+Indexes are cached per process for REPORTS_ACL_TTL seconds, together
+with the folders' version stamp (common.caching.get_stamp) they were
+built from. Saving or deleting a ReportFolder bumps the stamp once the
+change commits (see reports/signals.py); each lookup compares stamps, a
+cache lookup and no DB query. With a shared cache backend a folder
+revoked through another gunicorn worker stops being listed and
+downloadable on the next request; with the default LocMemCache, when the
+index expires.
+"""
+import threading
+
+from django.conf import settings
+
+from common.caching import TTLCache, bump_stamp, get_stamp
+
+from .models import ReportFolder
+
+_END = object()
+
+
+class PrefixTrie:
+    def __init__(self, folders):
+        self.folders = list(folders)
+        self._by_id = {folder.id: folder for folder in self.folders}
+        self._root = {}
+        for folder in self.folders:
+            node = self._root
+            for char in folder.s3_prefix:
+                node = node.setdefault(char, {})
+            node.setdefault(_END, []).append(folder)
+
+    def matches(self, key):
+        """Folders whose prefix is a prefix of `key`, shortest prefix first."""
+        found = []
+        node = self._root
+        found.extend(node.get(_END, ()))
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend(node.get(_END, ()))
+        return found
+
+    def longest_match(self, key):
+        matches = self.matches(key)
+        return matches[-1] if matches else None
+
+    def allows(self, key):
+        return self.longest_match(key) is not None
+
+    def folder(self, folder_id):
+        return self._by_id.get(folder_id)
+
+
+_indexes = None
+_indexes_lock = threading.Lock()
+
+
+def _get_cache():
+    global _indexes
+    if _indexes is None:
+        with _indexes_lock:
+            if _indexes is None:
+                _indexes = TTLCache(maxsize=256, ttl=settings.REPORTS_ACL_TTL)
+    return _indexes
+
+
+FOLDERS_STAMP = 'report-folders-version'
+
+
+def folders_version():
+    return get_stamp(FOLDERS_STAMP)
+
+
+def get_access_index(company, role):
+    """Trie of the folders visible to `role` within `company` (empty for unknown roles)."""
+    indexes = _get_cache()
+    version = folders_version()
+    entry = indexes.get((company, role))
+    if entry is None or entry[0] != version:
+        entry = (version, PrefixTrie(ReportFolder.objects.visible_to(company, role).order_by('id')))
+        indexes.set((company, role), entry)
+    return entry[1]
+
+
+def clear_access_indexes():
+    """Drop the indexes of every process sharing the cache (this one at once)."""
+    _get_cache().clear()
+    bump_stamp(FOLDERS_STAMP)
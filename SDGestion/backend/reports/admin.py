@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import ReportFolder
+from .models import ReportFolder, ReportObject
 
 @admin.register(ReportFolder)
 class ReportFolderAdmin(admin.ModelAdmin):
-    list_display = ('name', 's3_prefix', 'company', 'role_required', 'created_at')
+    list_display = ('name', 's3_prefix', 'company', 'role_required', 'created_at', 'synced_at')
     list_filter = ('company', 'role_required')
     search_fields = ('name', 's3_prefix')
+
+@admin.register(ReportObject)
+class ReportObjectAdmin(admin.ModelAdmin):
+    list_display = ('key', 'folder', 'size', 'last_modified', 'indexed_at')
+    list_filter = ('folder',)
+    search_fields = ('key',)
+    readonly_fields = ('folder', 'key', 'name', 'size', 'last_modified', 'etag', 'indexed_at')
@@ -0,0 +1,163 @@
+"""
+ZIP archives of reports, built on the fly from S3.
+
+`stream_zip` is a generator of ZIP bytes: a background thread reads the
+S3 GetObject bodies into a bounded queue while the request thread
+compresses, so downloading the next chunk overlaps with deflating the
+previous one. The archive is written to an unseekable sink (sizes go in
+data descriptors) and drained after every write, so memory stays at
+about REPORTS_ZIP_BUFFER_CHUNKS × REPORTS_ZIP_CHUNK_SIZE whatever the
+number and size of the files, and nothing touches the disk.
+
+Callers must have authorized every key.
+"""
+import logging
+import queue
+import threading
+import zipfile
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Already compressed: deflating them again only costs CPU
+STORED_EXTENSIONS = ('.xlsx', '.xls', '.zip', '.gz', '.pdf', '.png', '.jpg', '.jpeg')
+
+
+class _Sink:
+    """Write-only file object collecting zipfile output until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _put(chunks, item, cancelled):
+    # Give up when the client went away instead of blocking forever on a full queue
+    while not cancelled.is_set():
+        try:
+            chunks.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _fetch(s3_client, bucket, entries, chunks, cancelled, chunk_size):
+    try:
+        for key, arcname in entries:
+            try:
+                response = s3_client.get_object(Bucket=bucket, Key=key)
+                body = response['Body']
+                try:
+                    if not _put(chunks, ('start', arcname, response.get('LastModified')), cancelled):
+                        return
+                    for chunk in body.iter_chunks(chunk_size):
+                        if not _put(chunks, ('data', chunk), cancelled):
+                            return
+                finally:
+                    body.close()
+                if not _put(chunks, ('end',), cancelled):
+                    return
+            except Exception as e:
+                # S3 errors, but also read timeouts and the like: skip the file, keep going
+                logger.warning("Could not add %s to archive: %s", key, e)
+                if not _put(chunks, ('error', key, str(e)), cancelled):
+                    return
+    finally:
+        # Always tell the reader we are done, whatever happened
+        _put(chunks, None, cancelled)
+
+
+def safe_arcname(name):
+    """Relative path inside the archive: no leading '/', no '.' or '..' segments (zip-slip)."""
+    segments = [
+        segment for segment in name.replace('\\', '/').split('/')
+        if segment and segment not in ('.', '..')
+    ]
+    return '/'.join(segments) or 'archivo'
+
+
+def _zip_info(arcname, last_modified):
+    modified = timezone.localtime(last_modified) if last_modified else timezone.localtime()
+    info = zipfile.ZipInfo(safe_arcname(arcname), date_time=max(modified.timetuple()[:6], (1980, 1, 1, 0, 0, 0)))
+    if arcname.lower().endswith(STORED_EXTENSIONS):
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def stream_zip(s3_client, bucket, entries):
+    """
+    Yield a ZIP archive of `entries` ([(key, name in archive), ...]).
+
+    Objects that cannot be read are skipped and listed in an ERRORES.txt
+    entry, since the response status is long gone when they fail. Names
+    are made relative with `safe_arcname`.
+    """
+    chunks = queue.Queue(maxsize=settings.REPORTS_ZIP_BUFFER_CHUNKS)
+    cancelled = threading.Event()
+    fetcher = threading.Thread(
+        target=_fetch,
+        args=(s3_client, bucket, list(entries), chunks, cancelled, settings.REPORTS_ZIP_CHUNK_SIZE),
+        name='report-zip',
+        daemon=True,
+    )
+    fetcher.start()
+
+    sink = _Sink()
+    errors = []
+    try:
+        archive = zipfile.ZipFile(sink, 'w', allowZip64=True)
+        current = None
+        while True:
+            try:
+                item = chunks.get(timeout=1)
+            except queue.Empty:
+                if not fetcher.is_alive() and chunks.empty():
+                    # The reader is gone without its end marker: finish what we have
+                    errors.append("El archivo está incompleto: la lectura de S3 se interrumpió")
+                    break
+                continue
+            if item is None:
+                break
+
+            kind = item[0]
+            if kind == 'start':
+                current = archive.open(_zip_info(item[1], item[2]), 'w', force_zip64=True)
+            elif kind == 'data':
+                current.write(item[1])
+            elif kind == 'end':
+                current.close()
+                current = None
+            elif kind == 'error':
+                if current is not None:
+                    # Failed mid-body: keep what was read, but report it
+                    current.close()
+                    current = None
+                errors.append(f"{item[1]}: {item[2]}")
+
+            data = sink.drain()
+            if data:
+                yield data
+
+        if errors:
+            archive.writestr('ERRORES.txt', '\n'.join(errors) + '\n')
+        archive.close()
+        yield sink.drain()
+    finally:
+        # Also reached when the client disconnects (the generator is closed)
+        cancelled.set()
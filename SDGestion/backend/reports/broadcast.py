@@ -0,0 +1,109 @@
+"""
+In-process fan-out of ReportChange rows to Server-Sent Events subscribers.
+
+One `ChangeBroadcaster` per event loop (i.e. per ASGI worker process)
+polls the change log every REPORTS_SSE_POLL_INTERVAL seconds with a
+single query, whatever the number of connected clients, and pushes each
+change to the queues of the subscribers allowed to see its folder.
+Subscribers are plain asyncio queues, so an idle connection costs no
+thread. The poller runs only while someone is subscribed.
+
+A subscriber that falls REPORTS_SSE_QUEUE_SIZE events behind is marked
+as overflowed and disconnected; EventSource reconnects on its own and
+the client can catch up with the delta API.
+"""
+import asyncio
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+
+from .models import ReportChange
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+class Subscription:
+    def __init__(self, folder_ids, maxsize):
+        self.folder_ids = frozenset(folder_ids)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, change):
+        if self.overflowed or change.folder_id not in self.folder_ids:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wake the reader up so it can close the stream
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+def _newest_id():
+    return ReportChange.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+
+def _changes_after(last_id):
+    return list(ReportChange.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+
+
+class ChangeBroadcaster:
+    def __init__(self):
+        self._subscribers = set()
+        self._task = None
+        self._last_id = None
+
+    def subscribe(self, folder_ids):
+        subscription = Subscription(folder_ids, settings.REPORTS_SSE_QUEUE_SIZE)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    async def _poll(self):
+        try:
+            if self._last_id is None:
+                # Only changes made from now on are pushed
+                self._last_id = await sync_to_async(_newest_id)()
+            while True:
+                changes = await sync_to_async(_changes_after)(self._last_id)
+                for change in changes:
+                    for subscription in list(self._subscribers):
+                        subscription.offer(change)
+                if changes:
+                    self._last_id = changes[-1].id
+                if len(changes) < BATCH_SIZE:
+                    return
+        except Exception as e:
+            logger.warning("Polling report changes failed: %s", e)
+            # The connection of the poller thread may be broken: get a new one next time
+            await sync_to_async(close_old_connections)()
+
+    async def _run(self):
+        while self._subscribers:
+            await self._poll()
+            await asyncio.sleep(settings.REPORTS_SSE_POLL_INTERVAL)
+        # Resume from the current position the next time someone subscribes
+        self._last_id = None
+
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def get_broadcaster():
+    """Broadcaster of the running event loop."""
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = _broadcasters[loop] = ChangeBroadcaster()
+    return broadcaster
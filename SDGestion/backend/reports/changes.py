@@ -0,0 +1,149 @@
+"""
+Delta API over the ReportChange log.
+
+Listings carry an opaque cursor (the X-Reports-Cursor header) naming the
+last change they include; `api/reports/changes/?cursor=...` returns what
+was added to or removed from the visible folders after it, and a new
+cursor. Polling clients then transfer data proportional to the changes
+rather than to the size of the archive.
+
+A cursor is the greatest change id committed when it was read, which is
+only safe if ids become visible in order: a change with a smaller id
+committing later would be skipped forever. Writers therefore take a
+transaction-level lock before inserting changes (PostgreSQL advisory
+lock; SQLite already serializes writers) and keep it until they commit,
+so changes commit in id order.
+
+Cursors record when they were issued. Changes older than
+REPORTS_CHANGES_RETENTION seconds are pruned by `sync_reports`, so an
+older cursor may have missed some: it is rejected with CursorExpired and
+the client reloads the full listing.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from common.cursors import InvalidCursor, decode_cursor, encode_cursor
+
+from .models import ReportChange
+
+
+class CursorExpired(Exception):
+    pass
+
+
+# Arbitrary, application-wide id of the change log advisory lock
+CHANGE_LOG_LOCK_ID = 0x52455043
+
+
+def _lock_change_log():
+    """Serialize change writers until the current transaction ends."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK_ID])
+
+
+def record_added(objects):
+    """Log ReportObjects (new or changed) as added. Call inside the transaction that changed them."""
+    objects = list(objects)
+    if not objects:
+        return
+    _lock_change_log()
+    ReportChange.objects.bulk_create([
+        ReportChange(
+            folder_id=obj.folder_id,
+            action=ReportChange.ADDED,
+            key=obj.key,
+            name=obj.name,
+            size=obj.size,
+            last_modified=obj.last_modified,
+        )
+        for obj in objects
+    ], batch_size=500)
+
+
+def record_removed(folder_id, keys):
+    keys = list(keys)
+    if not keys:
+        return
+    _lock_change_log()
+    ReportChange.objects.bulk_create([
+        ReportChange(folder_id=folder_id, action=ReportChange.REMOVED, key=key, name=key.split('/')[-1])
+        for key in keys
+    ], batch_size=500)
+
+
+def current_cursor():
+    """Cursor for "everything up to now": read it before building a listing."""
+    last_id = ReportChange.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    return encode_cursor({'change': last_id, 'at': int(time.time())})
+
+
+def _parse_cursor(cursor):
+    data = decode_cursor(cursor)
+    try:
+        last_id = int(data['change'])
+        issued_at = int(data['at'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    if time.time() - issued_at > settings.REPORTS_CHANGES_RETENTION:
+        raise CursorExpired('Cursor expired, reload the full listing')
+    return last_id, issued_at
+
+
+def list_changes(folder_ids, cursor, limit):
+    """
+    Changes of `folder_ids` after `cursor`, at most `limit` of them.
+
+    Several changes of the same key collapse into the latest one. Returns
+    {"added": [file + folder], "removed": [{"folder", "key", "name"}],
+    "cursor", "has_more"}. Raises InvalidCursor or CursorExpired.
+    """
+    last_id, issued_at = _parse_cursor(cursor)
+    # Read first: a change committed while we page has a greater id (writers
+    # commit in id order) and is picked up next time
+    newest_id = ReportChange.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    changes = list(
+        ReportChange.objects
+        .filter(id__gt=last_id, id__lte=newest_id, folder_id__in=folder_ids)
+        .order_by('id')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {}
+    for change in changes:
+        latest.pop((change.folder_id, change.key), None)
+        latest[(change.folder_id, change.key)] = change
+
+    added = []
+    removed = []
+    for change in latest.values():
+        if change.action == ReportChange.ADDED:
+            added.append({"folder": change.folder_id, **change.as_file()})
+        else:
+            removed.append({"folder": change.folder_id, "key": change.key, "name": change.name})
+
+    if has_more:
+        # The rest may be as old as the original cursor: keep its issue time
+        next_cursor = encode_cursor({'change': changes[-1].id, 'at': issued_at})
+    else:
+        next_cursor = encode_cursor({'change': max(last_id, newest_id), 'at': int(time.time())})
+    return {
+        "added": added,
+        "removed": removed,
+        "cursor": next_cursor,
+        "has_more": has_more,
+    }
+
+
+def prune_changes():
+    """Delete changes older than REPORTS_CHANGES_RETENTION. Returns the number deleted."""
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORTS_CHANGES_RETENTION)
+    deleted, _ = ReportChange.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
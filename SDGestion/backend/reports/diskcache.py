@@ -0,0 +1,261 @@
+"""
+Read-through disk cache for proxied report downloads.
+
+With REPORTS_PROXY_DOWNLOADS on, download endpoints hand out signed
+`api/reports/download/file/` URLs instead of S3 presigned URLs. That view
+serves the object from REPORTS_DISK_CACHE_DIR when a copy of the current
+version is there, and otherwise redirects to the presigned URL while the
+object is copied to disk in the background, so hot reports (the daily
+sales sheet of each company) are read from S3 once instead of on every
+download.
+
+- Entries are keyed by object key and stored with their ETag; a copy is
+  revalidated with a conditional GetObject (IfNoneMatch) at most every
+  REPORTS_DISK_CACHE_REVALIDATE seconds.
+- The cache is an LRU bounded by REPORTS_DISK_CACHE_MAX_BYTES: hits touch
+  the file's mtime and the least recently used files are evicted after
+  each fill. Objects larger than REPORTS_DISK_CACHE_MAX_OBJECT_BYTES are
+  never cached.
+- Each version is written to a temporary name and renamed to a unique
+  data file, then the meta file (which names its data file) is replaced.
+  Data files are never rewritten in place, so a reader that opened the
+  file named by the meta it read gets exactly that version, and never a
+  partial file. An entry evicted between `lookup` and `open_data` is a
+  miss, not an error.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from .storage import get_listing_executor
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'reports.download.file'
+
+_filling = set()
+_filling_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+def make_file_token(key):
+    """Signed token for the proxy download of an already authorized `key`."""
+    return signing.dumps({'key': key}, salt=TOKEN_SALT, compress=True)
+
+
+def load_file_token(token):
+    """Key of a token made by `make_file_token`. Raises signing.BadSignature (or SignatureExpired)."""
+    return signing.loads(token, salt=TOKEN_SALT, max_age=settings.REPORTS_PRESIGN_EXPIRES)['key']
+
+
+class CachedObject:
+    def __init__(self, path, meta):
+        self.path = path
+        self.key = meta['key']
+        self.etag = meta['etag']
+        self.size = meta['size']
+        self.content_type = meta.get('content_type') or 'application/octet-stream'
+        self.validated_at = meta['validated_at']
+        self.meta = meta
+
+
+def _paths(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    directory = os.path.join(settings.REPORTS_DISK_CACHE_DIR, digest[:2])
+    return directory, digest, os.path.join(directory, f'{digest}.json')
+
+
+def _write_meta(meta_path, meta):
+    directory = os.path.dirname(meta_path)
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as tmp:
+        json.dump(meta, tmp)
+    os.replace(tmp.name, meta_path)
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def lookup(key):
+    """Cached copy of `key` (any version), or None."""
+    directory, _, meta_path = _paths(key)
+    meta = _read_meta(meta_path)
+    if not meta or meta.get('key') != key or not meta.get('file'):
+        return None
+    data_path = os.path.join(directory, meta['file'])
+    if not os.path.exists(data_path):
+        return None
+    return CachedObject(data_path, meta)
+
+
+def open_data(cached):
+    """Open the data file of `cached`, or None if it was evicted or replaced meanwhile."""
+    try:
+        return open(cached.path, 'rb')
+    except FileNotFoundError:
+        return None
+
+
+def touch(cached):
+    # mtime is the LRU clock (atime is often disabled)
+    try:
+        os.utime(cached.path)
+    except OSError:
+        pass
+
+
+def revalidate(s3_client, bucket, cached):
+    """
+    Check the cached copy against S3 with a conditional GET.
+
+    Returns None when the copy is current, else the open GetObject
+    response of the new version. Raises ClientError, after dropping the
+    copy when the object was deleted.
+    """
+    if time.time() - cached.validated_at < settings.REPORTS_DISK_CACHE_REVALIDATE:
+        return None
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=cached.key, IfNoneMatch=f'"{cached.etag}"')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            _, _, meta_path = _paths(cached.key)
+            _write_meta(meta_path, {**cached.meta, 'validated_at': time.time()})
+            return None
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+            remove(cached.key)
+        raise
+    return response
+
+
+def remove(key):
+    directory, _, meta_path = _paths(key)
+    meta = _read_meta(meta_path)
+    paths = [meta_path]
+    if meta and meta.get('file'):
+        paths.append(os.path.join(directory, meta['file']))
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _store(key, response):
+    """Copy an open GetObject response to disk."""
+    size = response.get('ContentLength') or 0
+    body = response['Body']
+    try:
+        if size > settings.REPORTS_DISK_CACHE_MAX_OBJECT_BYTES:
+            return
+        directory, digest, meta_path = _paths(key)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False, suffix='.tmp') as tmp:
+            try:
+                for chunk in body.iter_chunks(1024 * 1024):
+                    tmp.write(chunk)
+            except BaseException:
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+        # A new data file per version: readers of the previous one are unaffected
+        name = f'{digest}.{uuid.uuid4().hex}'
+        os.replace(tmp.name, os.path.join(directory, name))
+        previous = _read_meta(meta_path)
+        _write_meta(meta_path, {
+            'key': key,
+            'file': name,
+            'etag': response.get('ETag', '').strip('"'),
+            'size': size,
+            'content_type': response.get('ContentType'),
+            'validated_at': time.time(),
+        })
+        if previous and previous.get('file') and previous['file'] != name:
+            try:
+                os.remove(os.path.join(directory, previous['file']))
+            except FileNotFoundError:
+                pass
+    finally:
+        body.close()
+    evict()
+
+
+def _fill(s3_client, bucket, key, response, lock_key):
+    try:
+        if response is None:
+            response = s3_client.get_object(Bucket=bucket, Key=key)
+        _store(key, response)
+    except (ClientError, BotoCoreError, OSError) as e:
+        logger.warning("Could not cache %s on disk: %s", key, e)
+    finally:
+        with _filling_lock:
+            _filling.discard(key)
+        cache.delete(lock_key)
+
+
+def fill_async(s3_client, bucket, key, response=None):
+    """
+    Copy `key` to disk in the background (once per key across workers).
+    `response` may be an already open GetObject response to consume.
+    """
+    lock_key = f"reports:diskfill:{hashlib.sha256(key.encode()).hexdigest()}"
+    with _filling_lock:
+        if key in _filling or not cache.add(lock_key, 1, timeout=300):
+            if response is not None:
+                response['Body'].close()
+            return
+        _filling.add(key)
+    get_listing_executor().submit(_fill, s3_client, bucket, key, response, lock_key)
+
+
+def evict():
+    """Remove least recently used files until the cache fits REPORTS_DISK_CACHE_MAX_BYTES."""
+    root = settings.REPORTS_DISK_CACHE_DIR
+    with _evict_lock:
+        entries = []
+        total = 0
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(('.json', '.tmp')):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= settings.REPORTS_DISK_CACHE_MAX_BYTES:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            # "<digest>.<version>": drop the meta too if it still names this file
+            directory, name = os.path.split(path)
+            meta_path = os.path.join(directory, f"{name.split('.')[0]}.json")
+            meta = _read_meta(meta_path)
+            if meta and meta.get('file') == name:
+                try:
+                    os.remove(meta_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            if total <= settings.REPORTS_DISK_CACHE_MAX_BYTES:
+                break
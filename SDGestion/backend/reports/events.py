@@ -0,0 +1,199 @@
+"""
+Ingestion of S3 event notifications into the report object index.
+
+Accepts the payloads S3 can deliver, directly or through SNS/SQS:
+
+- an S3 event: {"Records": [{"eventName": "ObjectCreated:Put", "s3": {...}}]}
+- an SNS notification whose "Message" is an S3 event (JSON string)
+- an SQS message (or batch) whose "body" is either of the above
+
+Each change is applied to `ReportObject` under every ReportFolder whose
+prefix covers the key (as `sync_folder` indexes it), so the index stays
+fresh with a cost proportional to the number of changed objects.
+
+S3 does not deliver events in order. The `sequencer` of the last event
+applied to each key is stored in `ReportKeySequencer`, also after a
+deletion, and older events are ignored, within a batch and across
+batches.
+"""
+import json
+import logging
+from datetime import timedelta
+from urllib.parse import unquote_plus
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .access import PrefixTrie
+from .changes import record_added, record_removed
+from .models import ReportFolder, ReportKeySequencer, ReportObject
+from .storage import parse_file
+from .summary import SummaryDelta, apply_delta, lock_summaries
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def extract_records(payload):
+    """Flatten a (possibly wrapped) notification payload into S3 event records."""
+    if isinstance(payload, (str, bytes)):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            raise InvalidEvent('Payload is not valid JSON')
+
+    if isinstance(payload, list):
+        return [record for item in payload for record in extract_records(item)]
+    if not isinstance(payload, dict):
+        raise InvalidEvent('Unexpected payload')
+
+    # SNS envelope
+    if payload.get('Type') == 'Notification' and 'Message' in payload:
+        return extract_records(payload['Message'])
+    # SQS message
+    if 'body' in payload and 'Records' not in payload:
+        return extract_records(payload['body'])
+
+    records = []
+    for record in payload.get('Records', []):
+        if 'body' in record:
+            records.extend(extract_records(record['body']))
+        elif 's3' in record:
+            records.append(record)
+    # S3 sends a test event when notifications are configured: nothing to apply
+    return records
+
+
+def _newer(sequencer, than):
+    """Sequencers compare as hex strings, the shorter one padded with trailing zeros."""
+    width = max(len(sequencer), len(than))
+    return sequencer.ljust(width, '0') > than.ljust(width, '0')
+
+
+def _latest_per_key(records):
+    """Keep the last event of each key, ordered by S3's `sequencer`. Returns {key: (sequencer, record)}."""
+    latest = {}
+    for record in records:
+        s3 = record['s3']
+        key = unquote_plus(s3['object']['key'])
+        sequencer = s3['object'].get('sequencer', '').upper()
+        current = latest.get(key)
+        if current is None or not _newer(current[0], sequencer):
+            latest[key] = (sequencer, record)
+    return latest
+
+
+def apply_records(records):
+    """Apply S3 event records to the index. Returns counts of upserted/deleted/ignored rows and keys."""
+    stats = {'upserted': 0, 'deleted': 0, 'ignored': 0}
+    if not records:
+        return stats
+
+    folders = PrefixTrie(ReportFolder.objects.all())
+    latest = _latest_per_key(records)
+
+    with transaction.atomic():
+        # Locked: a concurrent batch touching the same keys waits for this one
+        applied = dict(
+            ReportKeySequencer.objects
+            .select_for_update()
+            .filter(key__in=list(latest))
+            .values_list('key', 'sequencer')
+        )
+
+        upserts = []
+        deletes = {}
+        sequencers = []
+        for key, (sequencer, record) in latest.items():
+            if sequencer and key in applied and not _newer(sequencer, applied[key]):
+                logger.debug("Event for %s is older than the last applied one, ignoring", key)
+                stats['ignored'] += 1
+                continue
+            matches = folders.matches(key)
+            event_name = record.get('eventName', '')
+            if not matches or not event_name.startswith(('ObjectRemoved', 'ObjectCreated')):
+                logger.debug("No ReportFolder or unknown event for key %s, ignoring", key)
+                stats['ignored'] += 1
+                continue
+            if sequencer:
+                sequencers.append(ReportKeySequencer(key=key, sequencer=sequencer))
+
+            for folder in matches:
+                if event_name.startswith('ObjectRemoved'):
+                    deletes.setdefault(folder.id, []).append(key)
+                    continue
+                obj = record['s3']['object']
+                file = parse_file({'Key': key, 'Size': obj.get('size', 0)}, folder.s3_prefix)
+                if file is None:
+                    continue
+                upserts.append(ReportObject(
+                    folder=folder,
+                    key=key,
+                    name=file['name'],
+                    size=file['size'],
+                    last_modified=parse_datetime(record.get('eventTime', '')) or timezone.now(),
+                    etag=obj.get('eTag', ''),
+                ))
+
+        # Sizes of the rows about to be replaced or removed, for the folder summaries
+        lock_summaries({obj.folder_id for obj in upserts} | set(deletes))
+        touched = [obj.key for obj in upserts] + [key for keys in deletes.values() for key in keys]
+        existing = {
+            (folder_id, key): size
+            for folder_id, key, size in ReportObject.objects
+            .filter(key__in=touched)
+            .values_list('folder_id', 'key', 'size')
+        } if touched else {}
+        deltas = {}
+        for obj in upserts:
+            delta = deltas.setdefault(obj.folder_id, SummaryDelta())
+            previous_size = existing.get((obj.folder_id, obj.key))
+            if previous_size is None:
+                delta.add(obj)
+            else:
+                delta.update(obj, previous_size)
+        for folder_id, keys in deletes.items():
+            for key in keys:
+                if (folder_id, key) in existing:
+                    deltas.setdefault(folder_id, SummaryDelta()).remove(key, existing[(folder_id, key)])
+
+        if upserts:
+            ReportObject.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['folder', 'key'],
+                update_fields=['name', 'size', 'last_modified', 'etag', 'indexed_at'],
+            )
+        for folder_id, keys in deletes.items():
+            ReportObject.objects.filter(folder_id=folder_id, key__in=keys).delete()
+            record_removed(folder_id, keys)
+        record_added(upserts)
+        for folder_id, delta in deltas.items():
+            apply_delta(folder_id, delta)
+        if sequencers:
+            ReportKeySequencer.objects.bulk_create(
+                sequencers,
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['sequencer', 'updated_at'],
+            )
+
+    stats['upserted'] = len(upserts)
+    stats['deleted'] = sum(len(keys) for keys in deletes.values())
+    return stats
+
+
+def prune_sequencers():
+    """Forget the sequencers of keys without events for REPORTS_CHANGES_RETENTION. Returns the number deleted."""
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORTS_CHANGES_RETENTION)
+    deleted, _ = ReportKeySequencer.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted
+
+
+def ingest(payload):
+    return apply_records(extract_records(payload))
@@ -0,0 +1,243 @@
+"""
+Server-side filtering, sorting and limits for report listings.
+
+Query parameters (all optional):
+
+- `since` / `until`: ISO date or datetime bounds on last_modified. A bare
+  date in `until` includes that whole day.
+- `q`: case-insensitive filename match. Substring by default, a glob when
+  it contains `*` or `?` (e.g. `ventas_2024-*.csv`).
+- `ext`: comma-separated extensions (`csv,xlsx`).
+- `min_size` / `max_size`: size bounds in bytes.
+- `sort`: `last_modified`, `name` or `size`, `-` prefix for descending
+  (default `-last_modified`).
+- `limit`: at most this many files per folder.
+
+The same `FileFilter` is applied as SQL to the object index and, in S3
+mode, to the parsed listing, so both sources return the same files.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lower, RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+SORT_FIELDS = ('last_modified', 'name', 'size')
+DEFAULT_SORT = '-last_modified'
+FILTER_PARAMS = ('since', 'until', 'q', 'ext', 'min_size', 'max_size', 'sort', 'limit')
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _parse_bound(value, name, end_of_day=False):
+    if not value:
+        return None
+    try:
+        # Dates first: parse_datetime also accepts a bare date (as midnight)
+        day = parse_date(value)
+        if day is not None:
+            if end_of_day:
+                day += timedelta(days=1)
+            parsed = datetime.combine(day, time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+    except ValueError:
+        raise InvalidFilter(f"'{name}' must be an ISO date or datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _string_params(params):
+    # JSON bodies may carry numbers, lists or objects where query params are strings
+    values = {}
+    for name in FILTER_PARAMS:
+        value = params.get(name)
+        if value is None:
+            continue
+        if name == 'ext' and isinstance(value, list) and all(isinstance(ext, str) for ext in value):
+            value = ','.join(value)
+        elif isinstance(value, int) and not isinstance(value, bool) and name in ('limit', 'min_size', 'max_size'):
+            value = str(value)
+        elif not isinstance(value, str):
+            raise InvalidFilter(f"'{name}' must be a string")
+        values[name] = value
+    return values
+
+
+def _parse_int(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidFilter(f"'{name}' must be an integer")
+    if number < 0:
+        raise InvalidFilter(f"'{name}' must not be negative")
+    return number
+
+
+def _glob_to_regex(pattern):
+    # Only `*` and `?` are special; the result is valid for both Python and PostgreSQL
+    parts = []
+    for char in pattern:
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return '^' + ''.join(parts) + '$'
+
+
+@dataclass(frozen=True)
+class FileFilter:
+    since: datetime = None
+    until: datetime = None
+    q: str = None
+    extensions: tuple = ()
+    min_size: int = None
+    max_size: int = None
+    sort: str = DEFAULT_SORT
+    limit: int = None
+
+    @classmethod
+    def from_query(cls, params):
+        """Build a filter from request query params (or a JSON body). Raises InvalidFilter."""
+        params = _string_params(params)
+        sort = params.get('sort') or DEFAULT_SORT
+        if sort.lstrip('-') not in SORT_FIELDS:
+            raise InvalidFilter(f"'sort' must be one of {', '.join(SORT_FIELDS)} (prefix '-' for descending)")
+
+        extensions = tuple(sorted({
+            ext.strip().lstrip('.').lower()
+            for ext in params.get('ext', '').split(',')
+            if ext.strip().lstrip('.')
+        }))
+
+        limit = _parse_int(params.get('limit'), 'limit')
+        if limit == 0:
+            raise InvalidFilter("'limit' must be at least 1")
+
+        since = _parse_bound(params.get('since'), 'since')
+        # Exclusive upper bound: a bare date means "up to the end of that day"
+        until = _parse_bound(params.get('until'), 'until', end_of_day=True)
+
+        return cls(
+            since=since,
+            until=until,
+            q=params.get('q') or None,
+            extensions=extensions,
+            min_size=_parse_int(params.get('min_size'), 'min_size'),
+            max_size=_parse_int(params.get('max_size'), 'max_size'),
+            sort=sort,
+            limit=limit,
+        )
+
+    @property
+    def is_glob(self):
+        return self.q is not None and ('*' in self.q or '?' in self.q)
+
+    def key(self):
+        """Stable string identifying the filter (for cache keys and ETags)."""
+        return '|'.join([
+            self.since.isoformat() if self.since else '',
+            self.until.isoformat() if self.until else '',
+            self.q or '',
+            ','.join(self.extensions),
+            str(self.min_size if self.min_size is not None else ''),
+            str(self.max_size if self.max_size is not None else ''),
+            self.sort,
+            str(self.limit or ''),
+        ])
+
+    def ordering(self):
+        field = self.sort.lstrip('-')
+        descending = self.sort.startswith('-')
+        # Names sort case-insensitively; id breaks ties so the order is stable
+        expressions = [Lower(field) if field == 'name' else F(field), F('id')]
+        return [e.desc() if descending else e.asc() for e in expressions]
+
+    # Index (SQL)
+
+    def filter_queryset(self, queryset):
+        """Apply the row filters (not sort/limit) to a ReportObject queryset."""
+        if self.since:
+            queryset = queryset.filter(last_modified__gte=self.since)
+        if self.until:
+            queryset = queryset.filter(last_modified__lt=self.until)
+        if self.q:
+            if self.is_glob:
+                queryset = queryset.filter(name__iregex=_glob_to_regex(self.q))
+            else:
+                queryset = queryset.filter(name__icontains=self.q)
+        if self.extensions:
+            ext_filter = Q()
+            for ext in self.extensions:
+                ext_filter |= Q(name__iendswith=f'.{ext}')
+            queryset = queryset.filter(ext_filter)
+        if self.min_size is not None:
+            queryset = queryset.filter(size__gte=self.min_size)
+        if self.max_size is not None:
+            queryset = queryset.filter(size__lte=self.max_size)
+        return queryset
+
+    def apply_queryset(self, queryset):
+        """Filter, sort by folder then `sort`, and keep at most `limit` rows per folder."""
+        queryset = self.filter_queryset(queryset)
+        if self.limit:
+            queryset = queryset.annotate(
+                folder_rank=Window(RowNumber(), partition_by=F('folder_id'), order_by=self.ordering())
+            ).filter(folder_rank__lte=self.limit)
+        return queryset.order_by('folder_id', *self.ordering())
+
+    # S3 listing (parsed file dicts)
+
+    def matches(self, file):
+        name = file['name'].lower()
+        if self.since or self.until:
+            last_modified = parse_datetime(file['last_modified'] or '')
+            if last_modified is None:
+                return False
+            if self.since and last_modified < self.since:
+                return False
+            if self.until and last_modified >= self.until:
+                return False
+        if self.q:
+            if self.is_glob:
+                if not re.match(_glob_to_regex(self.q), file['name'], re.IGNORECASE | re.DOTALL):
+                    return False
+            elif self.q.lower() not in name:
+                return False
+        if self.extensions and not name.endswith(tuple(f'.{ext}' for ext in self.extensions)):
+            return False
+        if self.min_size is not None and file['size'] < self.min_size:
+            return False
+        if self.max_size is not None and file['size'] > self.max_size:
+            return False
+        return True
+
+    def apply_files(self, files):
+        """Filter, sort and limit a list of parsed files."""
+        field = self.sort.lstrip('-')
+        selected = [file for file in files if self.matches(file)]
+        if self.sort != DEFAULT_SORT:
+            # Listings are already newest first
+            if field == 'name':
+                sort_key = lambda file: file['name'].lower()
+            elif field == 'size':
+                sort_key = lambda file: file['size'] or 0
+            else:
+                sort_key = lambda file: file['last_modified'] or ''
+            selected.sort(key=sort_key, reverse=self.sort.startswith('-'))
+        return selected[:self.limit] if self.limit else selected
+
+
+NO_FILTER = FileFilter()
@@ -0,0 +1,190 @@
+"""
+Local index of the report objects stored in S3 (`ReportObject`).
+
+`sync_folder` reconciles one folder with S3:
+
+- full: list the whole prefix, insert new keys, update changed ones and
+  delete keys that disappeared.
+- incremental: only list the keys after the greatest indexed key
+  (`StartAfter`). Reports are named by date, so this picks up new files
+  with a listing proportional to the number of new keys. Deletions and
+  in-place overwrites are left to full syncs.
+
+With REPORTS_LIST_SOURCE='index', folders that were never synced are
+still listed live from S3 (see `is_indexed`), so a deploy or a new folder
+does not show empty listings until `sync_reports` has run.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from common.cursors import InvalidCursor
+
+from .changes import record_added, record_removed
+from .filters import NO_FILTER
+from .models import ReportObject
+from .storage import parse_file
+from .summary import SummaryDelta, apply_delta, lock_summaries, rebuild_summary
+
+
+def is_indexed(folder):
+    """Whether listings of `folder` come from the index rather than from S3."""
+    return settings.REPORTS_LIST_SOURCE == 'index' and folder.synced_at is not None
+
+
+def _to_object(folder, obj):
+    file = parse_file(obj, folder.s3_prefix)
+    if file is None:
+        return None
+
+    return ReportObject(
+        folder=folder,
+        key=file['key'],
+        name=file['name'],
+        size=file['size'],
+        last_modified=obj['LastModified'],
+        etag=obj.get('ETag', '').strip('"'),
+    )
+
+
+def _list_objects(s3_client, bucket, folder, start_after=None):
+    paginator = s3_client.get_paginator('list_objects_v2')
+    params = {'Bucket': bucket, 'Prefix': folder.s3_prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+
+    for page in paginator.paginate(**params):
+        for obj in page.get('Contents', []):
+            report_object = _to_object(folder, obj)
+            if report_object is not None:
+                yield report_object
+
+
+def sync_folder(folder, s3_client, bucket, full=True):
+    """Sync the index of `folder` with S3. Returns counts of created/updated/deleted keys."""
+    if not full and folder.synced_at is None:
+        # Never synced: nothing to be incremental from
+        full = True
+    # The first sync switches the folder from S3 to index listings: count it as a
+    # folder change so cached access indexes (holding synced_at=None) are rebuilt
+    update_fields = ['synced_at'] if folder.synced_at is not None else ['synced_at', 'updated_at']
+
+    stats = {'created': 0, 'updated': 0, 'deleted': 0}
+    synced_at = timezone.now()
+
+    if full:
+        listed = {obj.key: obj for obj in _list_objects(s3_client, bucket, folder)}
+
+        with transaction.atomic():
+            # Read under the lock: the event webhook may have changed the index while listing
+            lock_summaries([folder.id])
+            # Rows the webhook wrote after the listing started are newer than it: keep them
+            rows = list(folder.report_objects.all())
+            existing = {obj.key: obj for obj in rows if obj.indexed_at < synced_at}
+            newer = {obj.key for obj in rows if obj.indexed_at >= synced_at}
+
+            to_create = [obj for key, obj in listed.items() if key not in existing and key not in newer]
+            to_update = []
+            for key, current in existing.items():
+                obj = listed.get(key)
+                if obj is None:
+                    continue
+                if (current.etag, current.size, current.last_modified) != (obj.etag, obj.size, obj.last_modified):
+                    current.etag = obj.etag
+                    current.size = obj.size
+                    current.last_modified = obj.last_modified
+                    current.indexed_at = synced_at
+                    to_update.append(current)
+            to_delete = [current for key, current in existing.items() if key not in listed]
+
+            ReportObject.objects.bulk_create(to_create, batch_size=500)
+            ReportObject.objects.bulk_update(
+                to_update, ['etag', 'size', 'last_modified', 'indexed_at'], batch_size=500
+            )
+            ReportObject.objects.filter(id__in=[obj.id for obj in to_delete]).delete()
+            record_added(to_create + to_update)
+            record_removed(folder.id, [obj.key for obj in to_delete])
+            rebuild_summary(folder.id, folder.report_objects.only('key', 'size', 'last_modified'))
+            folder.synced_at = synced_at
+            folder.save(update_fields=update_fields)
+
+        stats.update(created=len(to_create), updated=len(to_update), deleted=len(to_delete))
+    else:
+        last_key = folder.report_objects.aggregate(last_key=Max('key'))['last_key']
+        to_create = list(_list_objects(s3_client, bucket, folder, start_after=last_key))
+
+        with transaction.atomic():
+            lock_summaries([folder.id])
+            # Keys the event webhook may have indexed already: not new, not counted again
+            indexed = set(
+                folder.report_objects
+                .filter(key__in=[obj.key for obj in to_create])
+                .values_list('key', flat=True)
+            )
+            to_create = [obj for obj in to_create if obj.key not in indexed]
+            ReportObject.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+            record_added(to_create)
+            delta = SummaryDelta()
+            for obj in to_create:
+                delta.add(obj)
+            apply_delta(folder.id, delta)
+            folder.synced_at = synced_at
+            folder.save(update_fields=update_fields)
+
+        stats['created'] = len(to_create)
+
+    return stats
+
+
+def indexed_rows(folders, filters=NO_FILTER):
+    """
+    Index rows of `folders` matching `filters`, grouped by folder id
+    (ascending) and sorted within each folder (newest first by default).
+    """
+    rows = (
+        ReportObject.objects
+        .filter(folder__in=[folder.id for folder in folders])
+        .only('folder_id', 'key', 'name', 'size', 'last_modified')
+    )
+    return filters.apply_queryset(rows)
+
+
+def list_indexed_files(folders, filters=NO_FILTER):
+    """
+    Files of every folder from the index, in one query.
+    Returns {folder_id: [file, ...]}.
+    """
+    files = {folder.id: [] for folder in folders}
+    for obj in indexed_rows(folders, filters).iterator(chunk_size=2000):
+        files[obj.folder_id].append(obj.as_file())
+    return files
+
+
+def list_indexed_page(folder, page_size, after=None):
+    """
+    One page of a folder's files from the index, newest first.
+
+    Keyset pagination on (last_modified, id): `after` is the position
+    returned with the previous page, so every page costs the same index
+    range scan. Returns the files and the position of the next page.
+    """
+    rows = folder.report_objects.order_by('-last_modified', '-id')
+    if after:
+        try:
+            last_modified = datetime.fromisoformat(after['last_modified'])
+            last_id = int(after['id'])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        rows = rows.filter(
+            Q(last_modified__lt=last_modified) | Q(last_modified=last_modified, id__lt=last_id)
+        )
+
+    page = list(rows[:page_size + 1])
+    next_after = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_after = {'last_modified': page[-1].last_modified.isoformat(), 'id': page[-1].id}
+    return [obj.as_file() for obj in page], next_after
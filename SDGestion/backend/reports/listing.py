@@ -0,0 +1,190 @@
+"""
+Builds the folder/file tree returned by ReportListView.
+"""
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db.models import Count, Max
+
+from common.clients import get_s3_client
+from .filters import NO_FILTER
+from .index import indexed_rows, is_indexed, list_indexed_files
+from .models import ReportObject
+from .storage import get_folder_files, get_listing_executor, peek_folder_files
+
+logger = logging.getLogger(__name__)
+
+
+def listing_key(company, folders, filters=NO_FILTER):
+    """Identifies a listing: the company, the exact set of folders visible to the role and the filters."""
+    parts = [settings.REPORTS_LIST_SOURCE, company, filters.key()] + [f'{f.id}:{f.s3_prefix}' for f in folders]
+    return 'reports:list:' + hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+def listing_fingerprint(folders, filters=NO_FILTER):
+    """
+    Cheap version of a listing: the folders' change times plus, per folder,
+    the number of files and the newest last_modified. Returns an ETag, or
+    None when it cannot be known without listing S3. There is no
+    Last-Modified: removing a file or losing a folder does not move any
+    timestamp forward, the counts and folder set in the ETag do change.
+    """
+    versions = [[f.id, f.name, f.s3_prefix, f.updated_at.isoformat()] for f in folders]
+
+    indexed = [f.id for f in folders if is_indexed(f)]
+    stats = {}
+    if indexed:
+        stats = {
+            row['folder_id']: row
+            for row in ReportObject.objects
+            .filter(folder__in=indexed)
+            .values('folder_id')
+            .annotate(count=Count('id'), last_modified=Max('last_modified'), indexed_at=Max('indexed_at'))
+        }
+    for folder, version in zip(folders, versions):
+        if is_indexed(folder):
+            row = stats.get(folder.id)
+            if row:
+                version += [row['count'], row['last_modified'].isoformat(), row['indexed_at'].isoformat()]
+            continue
+        # Only from the listing cache: an uncached prefix would need an S3 call
+        files = peek_folder_files(settings.AWS_STORAGE_BUCKET_NAME, folder.s3_prefix)
+        if files is None:
+            return None
+        last_modified = max((f['last_modified'] for f in files if f['last_modified']), default=None)
+        version += ['s3', len(files), last_modified]
+
+    return hashlib.sha256(json.dumps([settings.REPORTS_LIST_SOURCE, filters.key(), versions]).encode()).hexdigest()
+
+
+def list_index_folders(folders, filters=NO_FILTER):
+    # Served from the local object index: one indexed query, no S3 call,
+    # except for folders never synced yet, listed live
+    live = {data['id']: data for data in iter_s3_folders([f for f in folders if not is_indexed(f)], filters)}
+    files = list_indexed_files([f for f in folders if is_indexed(f)], filters)
+    return [
+        {"id": folder.id, "name": folder.name, "files": files[folder.id]} if is_indexed(folder) else live[folder.id]
+        for folder in folders
+    ]
+
+
+def iter_s3_folders(folders, filters=NO_FILTER):
+    """Yield each folder with its files, in folder order, as soon as it is listed"""
+    if not folders:
+        return
+    s3_client = get_s3_client()
+
+    # List every folder concurrently, then collect in folder order
+    executor = get_listing_executor()
+    pending = [
+        (folder, executor.submit(get_folder_files, s3_client, settings.AWS_STORAGE_BUCKET_NAME, folder.s3_prefix))
+        for folder in folders
+    ]
+    deadline = time.monotonic() + settings.REPORTS_LIST_TIMEOUT
+
+    for folder, future in pending:
+        try:
+            # Filtered after the (cached) listing so every filter shares one S3 listing per prefix
+            files = filters.apply_files(future.result(timeout=max(0, deadline - time.monotonic())))
+            logger.debug("Found %d files in %s", len(files), folder.name)
+            yield {
+                "id": folder.id,
+                "name": folder.name,
+                "files": files
+            }
+
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning("S3 listing timed out for %s", folder.name)
+            yield {
+                "id": folder.id,
+                "name": f"{folder.name} (TIMEOUT)",
+                "files": [],
+                "error": f"Listing did not finish within {settings.REPORTS_LIST_TIMEOUT} seconds"
+            }
+        except ClientError as e:
+            logger.warning("S3 ClientError for %s: %s", folder.name, e)
+            yield {
+                "id": folder.id,
+                "name": f"{folder.name} (ACCESS ERROR)",
+                "files": [],
+                "error": str(e)
+            }
+        except Exception as e:
+            logger.exception("Error listing %s", folder.name)
+            yield {
+                "id": folder.id,
+                "name": f"{folder.name} (ERROR)",
+                "files": [],
+                "error": str(e)
+            }
+
+
+def list_s3_folders(folders, filters=NO_FILTER):
+    return list(iter_s3_folders(folders, filters))
+
+
+def list_folders(folders, filters=NO_FILTER):
+    """Folder/file tree of `folders`, from the index or from S3 (REPORTS_LIST_SOURCE)."""
+    if settings.REPORTS_LIST_SOURCE == 'index':
+        return list_index_folders(folders, filters)
+    return list_s3_folders(folders, filters)
+
+
+def _iter_index_json(folders, filters):
+    # Rows come grouped by folder id, in the same order as `folders`
+    rows = indexed_rows([f for f in folders if is_indexed(f)], filters).iterator(chunk_size=2000)
+    row = next(rows, None)
+    # Folders never synced are listed from S3 (concurrently, in folder order)
+    live = iter_s3_folders([f for f in folders if not is_indexed(f)], filters)
+
+    yield '['
+    for i, folder in enumerate(folders):
+        if not is_indexed(folder):
+            yield ('' if i == 0 else ',') + json.dumps(next(live))
+            continue
+        header = json.dumps({"id": folder.id, "name": folder.name})
+        yield ('' if i == 0 else ',') + header[:-1] + ',"files":['
+        first = True
+        while row is not None and row.folder_id == folder.id:
+            yield ('' if first else ',') + json.dumps(row.as_file())
+            first = False
+            row = next(rows, None)
+        yield ']}'
+    yield ']'
+
+
+def _iter_s3_json(folders, filters):
+    yield '['
+    for i, folder_data in enumerate(iter_s3_folders(folders, filters)):
+        yield ('' if i == 0 else ',') + json.dumps(folder_data)
+    yield ']'
+
+
+def stream_folders_json(folders, filters=NO_FILTER, chunk_size=64 * 1024):
+    """
+    Same JSON document as `list_folders`, produced incrementally: folders
+    and files are encoded as they are read, so memory stays flat however
+    many files are visible. Output is buffered into `chunk_size` pieces.
+    """
+    if settings.REPORTS_LIST_SOURCE == 'index':
+        parts = _iter_index_json(folders, filters)
+    else:
+        parts = _iter_s3_json(folders, filters)
+
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,33 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.events import InvalidEvent, ingest
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply S3 event notifications (raw, SNS or SQS JSON) to the ReportObject index. "
+        "Reads the given files, or stdin, e.g. piped from a queue consumer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='JSON files with recorded events (default: stdin)')
+
+    def handle(self, *args, **options):
+        sources = options['files'] or ['-']
+        for source in sources:
+            try:
+                if source == '-':
+                    payload = json.load(sys.stdin)
+                else:
+                    with open(source) as f:
+                        payload = json.load(f)
+                stats = ingest(payload)
+            except (OSError, ValueError, InvalidEvent, KeyError) as e:
+                raise CommandError(f"{source}: {e}")
+
+            self.stdout.write(
+                f"✓ {source}: {stats['upserted']} upserted, {stats['deleted']} deleted, {stats['ignored']} ignored"
+            )
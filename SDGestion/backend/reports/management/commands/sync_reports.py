@@ -0,0 +1,59 @@
+import time
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from common.clients import get_s3_client
+from reports.changes import prune_changes
+from reports.events import prune_sequencers
+from reports.index import sync_folder
+from reports.models import ReportFolder
+
+
+class Command(BaseCommand):
+    help = (
+        "Sync the ReportObject index with S3. Incremental by default (only keys "
+        "after the last indexed one); use --full to also pick up deletions and overwrites."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Re-list every prefix and reconcile the index')
+        parser.add_argument('--folder', type=int, action='append', dest='folders', help='Only sync this folder id (repeatable)')
+        parser.add_argument('--company', choices=[c for c, _ in ReportFolder.COMPANY_CHOICES], help='Only sync folders of this company')
+
+    def handle(self, *args, **options):
+        if not settings.AWS_STORAGE_BUCKET_NAME:
+            raise CommandError('AWS_STORAGE_BUCKET_NAME is not set')
+
+        folders = ReportFolder.objects.order_by('id')
+        if options['folders']:
+            folders = folders.filter(id__in=options['folders'])
+        if options['company']:
+            folders = folders.filter(company=options['company'])
+
+        s3_client = get_s3_client()
+        failures = 0
+        for folder in folders:
+            started = time.monotonic()
+            try:
+                stats = sync_folder(folder, s3_client, settings.AWS_STORAGE_BUCKET_NAME, full=options['full'])
+            except (ClientError, DatabaseError) as e:
+                failures += 1
+                self.stderr.write(f"✗ {folder.name} ({folder.s3_prefix}): {e}")
+                continue
+
+            self.stdout.write(
+                f"✓ {folder.name} ({folder.s3_prefix}): "
+                f"+{stats['created']} ~{stats['updated']} -{stats['deleted']} "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+        pruned = prune_changes()
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} old change(s)")
+        prune_sequencers()
+
+        if failures:
+            raise CommandError(f'{failures} folder(s) failed to sync')
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.models import ReportFolder
+from reports.warmup import shared_cache, warm_caches
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the report access indexes and folder listings for every "
+        "company/role, so the first requests after a deploy hit warm caches. "
+        "Only the S3 listings outlive this command, and only with a shared "
+        "cache backend (DJANGO_CACHE_BACKEND): to warm the gunicorn workers "
+        "themselves use REPORTS_WARM_ON_START."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.REPORTS_LIST_MAX_WORKERS, help='Folders listed in parallel')
+        parser.add_argument('--company', choices=[c for c, _ in ReportFolder.COMPANY_CHOICES], action='append', dest='companies', help='Only warm this company (repeatable)')
+
+    def handle(self, *args, **options):
+        if not shared_cache():
+            raise CommandError(
+                f"{settings.CACHES['default']['BACKEND']} is local to this process: nothing warmed here "
+                "would reach the server workers. Set DJANGO_CACHE_BACKEND to a shared cache, or use "
+                "REPORTS_WARM_ON_START to warm each gunicorn worker."
+            )
+        if settings.REPORTS_LIST_SOURCE != 'index' and not settings.AWS_STORAGE_BUCKET_NAME:
+            raise CommandError('AWS_STORAGE_BUCKET_NAME is not set')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        failures = warm_caches(workers=options['workers'], companies=options['companies'], log=self.stdout.write)
+        if failures:
+            raise CommandError(f'{failures} folder(s) failed to warm')
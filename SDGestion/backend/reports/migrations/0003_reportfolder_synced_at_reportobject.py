@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_reportfolder_delete_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportfolder',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, help_text='Last time the object index was synced with S3', null=True),
+        ),
+        migrations.CreateModel(
+            name='ReportObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=1024)),
+                ('name', models.CharField(help_text='Last segment of the key', max_length=1024)),
+                ('size', models.BigIntegerField(default=0)),
+                ('last_modified', models.DateTimeField()),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('folder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_objects', to='reports.reportfolder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['folder', '-last_modified', '-id'], name='reports_obj_folder_lm_idx')],
+                'constraints': [models.UniqueConstraint(fields=('folder', 'key'), name='reports_object_folder_key_uniq')],
+            },
+        ),
+    ]
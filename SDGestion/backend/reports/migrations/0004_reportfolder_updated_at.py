@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_reportfolder_synced_at_reportobject'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportfolder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
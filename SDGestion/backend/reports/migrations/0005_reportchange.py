@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_reportfolder_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('added', 'Added'), ('removed', 'Removed')], max_length=10)),
+                ('key', models.CharField(max_length=1024)),
+                ('name', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('last_modified', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('folder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='reports.reportfolder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['folder', 'id'], name='reports_change_folder_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_summaries(apps, schema_editor):
+    ReportFolder = apps.get_model('reports', 'ReportFolder')
+    ReportObject = apps.get_model('reports', 'ReportObject')
+    ReportFolderSummary = apps.get_model('reports', 'ReportFolderSummary')
+    for folder in ReportFolder.objects.all():
+        rows = ReportObject.objects.filter(folder=folder)
+        totals = rows.aggregate(count=Count('id'), size=Sum('size'))
+        newest = rows.order_by('-last_modified', '-id').first()
+        ReportFolderSummary.objects.create(
+            folder=folder,
+            file_count=totals['count'],
+            total_size=totals['size'] or 0,
+            newest_last_modified=newest.last_modified if newest else None,
+            newest_key=newest.key if newest else '',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_reportchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportFolderSummary',
+            fields=[
+                ('folder', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='reports.reportfolder')),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('total_size', models.BigIntegerField(default=0)),
+                ('newest_last_modified', models.DateTimeField(blank=True, null=True)),
+                ('newest_key', models.CharField(blank=True, max_length=1024)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,22 @@
 from django.db import models
+from django.utils import timezone
+
+
+class ReportFolderQuerySet(models.QuerySet):
+    def visible_to(self, company, role):
+        """Folders a user of `company` with `role` may see (none for unknown roles)"""
+        # Base filter: Company must match
+        folders = self.filter(company=company)
+
+        # Role filter
+        if role == 'Tienda':
+            return folders.filter(role_required='Tienda')
+        if role == 'Comercial':
+            return folders.filter(role_required__in=['Tienda', 'Comercial'])
+        if role == 'Admin':
+            return folders # Sees all roles within company
+        return self.none()
+
 
 class ReportFolder(models.Model):
     COMPANY_CHOICES = [
@@ -17,6 +35,114 @@ class ReportFolder(models.Model):
     company = models.CharField(max_length=50, choices=COMPANY_CHOICES)
     role_required = models.CharField(max_length=50, choices=ROLE_CHOICES, default='Tienda')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    synced_at = models.DateTimeField(null=True, blank=True, help_text="Last time the object index was synced with S3")
+
+    objects = ReportFolderQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} ({self.company})"
+
+
+class ReportObject(models.Model):
+    """
+    Local index of the S3 objects under a ReportFolder prefix.
+    Kept up to date by the `sync_reports` management command.
+    """
+    folder = models.ForeignKey(ReportFolder, on_delete=models.CASCADE, related_name='report_objects')
+    key = models.CharField(max_length=1024)
+    name = models.CharField(max_length=1024, help_text="Last segment of the key")
+    size = models.BigIntegerField(default=0)
+    last_modified = models.DateTimeField()
+    etag = models.CharField(max_length=255, blank=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['folder', 'key'], name='reports_object_folder_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['folder', '-last_modified', '-id'], name='reports_obj_folder_lm_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
+
+    def as_file(self):
+        """Same record shape as the S3 listing"""
+        return {
+            "name": self.name,
+            "key": self.key,
+            "last_modified": str(self.last_modified),
+            "size": self.size
+        }
+
+
+class ReportFolderSummary(models.Model):
+    """
+    Aggregates of a folder's indexed files for dashboards, maintained by
+    `sync_reports` and the S3 event ingestion (see reports/summary.py).
+    """
+    folder = models.OneToOneField(ReportFolder, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    file_count = models.PositiveIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)
+    newest_last_modified = models.DateTimeField(null=True, blank=True)
+    newest_key = models.CharField(max_length=1024, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.folder.name}: {self.file_count} files"
+
+
+class ReportChange(models.Model):
+    """
+    Append-only log of files added to or removed from the object index,
+    written by `sync_reports` and the S3 event ingestion. The id is the
+    position clients resume from (see reports/changes.py).
+    """
+    ADDED = 'added'
+    REMOVED = 'removed'
+    ACTION_CHOICES = [
+        (ADDED, 'Added'),
+        (REMOVED, 'Removed'),
+    ]
+
+    folder = models.ForeignKey(ReportFolder, on_delete=models.CASCADE, related_name='changes')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    key = models.CharField(max_length=1024)
+    name = models.CharField(max_length=1024)
+    size = models.BigIntegerField(null=True, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['folder', 'id'], name='reports_change_folder_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.key}"
+
+    def as_file(self):
+        """Same record shape as the S3 listing"""
+        return {
+            "name": self.name,
+            "key": self.key,
+            "last_modified": str(self.last_modified),
+            "size": self.size
+        }
+
+
+class ReportKeySequencer(models.Model):
+    """
+    Sequencer of the last S3 event applied to each key (see
+    reports/events.py). Kept after a deletion, so an older event delivered
+    late cannot bring the object back. Pruned by `sync_reports` after
+    REPORTS_CHANGES_RETENTION.
+    """
+    key = models.CharField(max_length=1024, unique=True)
+    sequencer = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} @ {self.sequencer}"
@@ -0,0 +1,271 @@
+"""
+Previews of CSV/XLSX reports read with S3 ranged GETs.
+
+- CSV: the object is read from the start in growing ranges (64 KiB,
+  then doubling) until the header and the requested rows are parsed, or
+  REPORTS_PREVIEW_MAX_BYTES have been read.
+- XLSX: `S3RangeReader` exposes the object as a seekable file, so zipfile
+  only fetches the central directory and the members it opens; the first
+  worksheet is parsed incrementally with iterparse and abandoned once
+  enough rows are read.
+
+Previews are cached per (key, ETag, rows): a new version of the object
+gets a new ETag and therefore a fresh preview.
+"""
+import csv
+import hashlib
+import io
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.core.cache import cache
+
+FIRST_RANGE = 64 * 1024
+SNIFF_DELIMITERS = ',;\t|'
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+class PreviewUnavailable(ValueError):
+    pass
+
+
+class S3RangeReader(io.RawIOBase):
+    """Read-only, seekable view of an S3 object; every read is a ranged GET of at least `block_size` bytes."""
+
+    def __init__(self, s3_client, bucket, key, size, etag=None, block_size=FIRST_RANGE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.block_size = block_size
+        self.bytes_fetched = 0
+        self._position = 0
+        self._block_start = 0
+        self._block = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        if position < 0:
+            raise ValueError('Negative seek position')
+        self._position = position
+        return position
+
+    def _fetch(self, start, length):
+        end = min(start + length, self.size) - 1
+        params = {'Bucket': self.bucket, 'Key': self.key, 'Range': f'bytes={start}-{end}'}
+        if self.etag:
+            # Never mix bytes of two versions of the object
+            params['IfMatch'] = self.etag
+        data = self.s3_client.get_object(**params)['Body'].read()
+        self.bytes_fetched += len(data)
+        return data
+
+    def readinto(self, buffer):
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+        offset = self._position - self._block_start
+        if not 0 <= offset < len(self._block):
+            self._block_start = self._position
+            self._block = self._fetch(self._position, max(len(buffer), self.block_size))
+            offset = 0
+        data = self._block[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def _decode(data):
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # Reports exported from Excel on Windows
+        return data.decode('cp1252', errors='replace')
+
+
+def preview_csv(reader, rows):
+    """Header and first `rows` rows of a CSV. Returns (columns, rows, truncated)."""
+    data = b''
+    length = FIRST_RANGE
+    while True:
+        end = min(reader.size, len(data) + length, settings.REPORTS_PREVIEW_MAX_BYTES)
+        if end > len(data):
+            reader.seek(len(data))
+            data += reader.read(end - len(data))
+        complete = len(data) >= reader.size
+
+        # Only parse whole lines: a range can end inside a line or a multi-byte character
+        usable = data if complete else data[:data.rfind(b'\n') + 1]
+        text = _decode(usable)
+        try:
+            dialect = csv.Sniffer().sniff(text[:FIRST_RANGE], delimiters=SNIFF_DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+        parsed = list(csv.reader(io.StringIO(text), dialect))
+        if not complete and parsed:
+            # A quoted field may span the cut: the last row is not trustworthy
+            parsed.pop()
+
+        if complete or len(parsed) > rows + 1 or end >= settings.REPORTS_PREVIEW_MAX_BYTES:
+            break
+        length *= 2
+
+    if not parsed:
+        return [], [], False
+    body = parsed[1:]
+    truncated = len(body) > rows or not complete
+    return parsed[0], body[:rows], truncated
+
+
+def _column_index(reference):
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _first_sheet(archive):
+    """(name, member path) of the first worksheet in workbook order."""
+    with archive.open('xl/workbook.xml') as workbook:
+        for _, element in iterparse(workbook):
+            if element.tag == f'{_NS}sheet':
+                name, rel_id = element.get('name'), element.get(f'{_REL_NS}id')
+                break
+        else:
+            raise PreviewUnavailable('Workbook has no sheets')
+
+    with archive.open('xl/_rels/workbook.xml.rels') as rels:
+        for _, element in iterparse(rels):
+            if element.tag == f'{_PKG_REL_NS}Relationship' and element.get('Id') == rel_id:
+                target = element.get('Target')
+                break
+        else:
+            raise PreviewUnavailable('Worksheet not found')
+
+    if target.startswith('/'):
+        return name, target.lstrip('/')
+    return name, posixpath.normpath(posixpath.join('xl', target))
+
+
+def _shared_strings(archive, needed):
+    """Shared strings with the indexes in `needed`, reading the table only up to the last one."""
+    strings = {}
+    if not needed or 'xl/sharedStrings.xml' not in archive.namelist():
+        return strings
+    last = max(needed)
+    with archive.open('xl/sharedStrings.xml') as table:
+        index = 0
+        for _, element in iterparse(table):
+            if element.tag != f'{_NS}si':
+                continue
+            if index in needed:
+                strings[index] = ''.join(t.text or '' for t in element.iter(f'{_NS}t'))
+            element.clear()
+            index += 1
+            if index > last:
+                break
+    return strings
+
+
+def preview_xlsx(reader, rows):
+    """Header and first `rows` rows of the first sheet. Returns (columns, rows, truncated, sheet name)."""
+    try:
+        archive = zipfile.ZipFile(reader)
+    except zipfile.BadZipFile:
+        raise PreviewUnavailable('Not a valid XLSX file')
+
+    with archive:
+        sheet_name, sheet_path = _first_sheet(archive)
+
+        parsed = []
+        truncated = False
+        with archive.open(sheet_path) as sheet:
+            for _, element in iterparse(sheet):
+                if element.tag != f'{_NS}row':
+                    continue
+                if len(parsed) == rows + 1:
+                    truncated = True
+                    break
+                cells = []
+                for cell in element.iter(f'{_NS}c'):
+                    column = _column_index(cell.get('r', '')) if cell.get('r') else len(cells)
+                    cells.extend([None] * (column - len(cells)))
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{_NS}t'))
+                    else:
+                        v = cell.find(f'{_NS}v')
+                        value = v.text if v is not None else None
+                        if kind == 's' and value is not None:
+                            value = ('s', int(value))
+                    cells.append(value)
+                parsed.append(cells)
+                element.clear()
+
+        needed = {value[1] for row in parsed for value in row if isinstance(value, tuple)}
+        strings = _shared_strings(archive, needed)
+
+    parsed = [
+        ['' if value is None else strings.get(value[1], '') if isinstance(value, tuple) else value for value in row]
+        for row in parsed
+    ]
+    if not parsed:
+        return [], [], False, sheet_name
+    return parsed[0], parsed[1:], truncated, sheet_name
+
+
+def _preview_cache_key(bucket, key, etag, rows):
+    digest = hashlib.sha256(f'{bucket}/{key}|{etag}|{rows}'.encode()).hexdigest()
+    return f'reports:preview:{digest}'
+
+
+def get_preview(s3_client, bucket, key, rows):
+    """
+    Preview of `key` as {"key", "columns", "rows", "truncated"} (plus
+    "sheet" for XLSX). Raises PreviewUnavailable for other file types.
+    Callers must have authorized the key.
+    """
+    extension = posixpath.splitext(key)[1].lower()
+    if extension not in ('.csv', '.txt', '.xlsx'):
+        raise PreviewUnavailable('Preview is only available for CSV and XLSX files')
+
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    etag = head.get('ETag', '')
+    cache_key = _preview_cache_key(bucket, key, etag, rows)
+    preview = cache.get(cache_key)
+    if preview is not None:
+        return preview
+
+    reader = S3RangeReader(s3_client, bucket, key, head['ContentLength'], etag)
+    if extension == '.xlsx':
+        columns, body, truncated, sheet = preview_xlsx(reader, rows)
+        preview = {"key": key, "sheet": sheet, "columns": columns, "rows": body, "truncated": truncated}
+    else:
+        columns, body, truncated = preview_csv(reader, rows)
+        preview = {"key": key, "columns": columns, "rows": body, "truncated": truncated}
+
+    cache.set(cache_key, preview, timeout=settings.REPORTS_PREVIEW_CACHE_TTL)
+    return preview
@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .access import clear_access_indexes
+from .models import ReportFolder
+
+
+@receiver(post_save, sender=ReportFolder)
+@receiver(post_delete, sender=ReportFolder)
+def rebuild_access_indexes(sender, update_fields=None, **kwargs):
+    """A folder change can affect several (company, role) indexes: drop them all"""
+    if update_fields is not None and set(update_fields) <= {'synced_at'}:
+        # Index sync bookkeeping, the folder itself did not change
+        return
+    # After commit: until then other workers would rebuild from the old rows
+    transaction.on_commit(clear_access_indexes)
@@ -0,0 +1,232 @@
+"""
+S3 listing helpers shared by the report views.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from common.caching import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def parse_file(obj, prefix):
+    """Turn a `list_objects_v2` entry into the file record sent to clients (None to skip)."""
+    key = obj['Key']
+
+    # Skip exact match of the folder prefix itself (empty placeholder)
+    if key == prefix or key == prefix + '/':
+        return None
+
+    filename = key.split('/')[-1]
+    if not filename:
+        return None
+
+    # Safely get LastModified and Size
+    last_modified = obj.get('LastModified')
+    size = obj.get('Size', 0)
+
+    # Explicitly convert datetime to string for JSON serialization
+    if last_modified:
+        last_modified = str(last_modified)
+
+    return {
+        "name": filename,
+        "key": key,
+        "last_modified": last_modified,
+        "size": size
+    }
+
+
+def list_folder_files(s3_client, bucket, prefix):
+    """List every file under `prefix` (following continuation tokens), newest first."""
+    paginator = s3_client.get_paginator('list_objects_v2')
+
+    files = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            file = parse_file(obj, prefix)
+            if file is not None:
+                files.append(file)
+
+    files.sort(key=lambda x: x['last_modified'] or '', reverse=True)
+    return files
+
+
+def list_folder_page(s3_client, bucket, prefix, page_size, continuation_token=None):
+    """
+    List one page of at most `page_size` keys under `prefix`.
+
+    S3 returns keys in lexicographic order, so pages follow key order and
+    the files of each page are sorted newest first. Returns the files and
+    the continuation token of the next page (None on the last page).
+    """
+    params = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': page_size}
+    if continuation_token:
+        params['ContinuationToken'] = continuation_token
+    response = s3_client.list_objects_v2(**params)
+
+    files = []
+    for obj in response.get('Contents', []):
+        file = parse_file(obj, prefix)
+        if file is not None:
+            files.append(file)
+    files.sort(key=lambda x: x['last_modified'] or '', reverse=True)
+
+    next_token = response.get('NextContinuationToken') if response.get('IsTruncated') else None
+    return files, next_token
+
+
+def list_folder_level(s3_client, bucket, prefix, page_size, continuation_token=None):
+    """
+    One level of the tree under `prefix` (which ends with '/'): the
+    immediate sub-"directories" (S3 CommonPrefixes with Delimiter='/')
+    and the files directly under it, at most `page_size` entries per call.
+
+    Returns (directories, files, next continuation token); directories
+    are the full prefixes, files the usual file records.
+    """
+    params = {'Bucket': bucket, 'Prefix': prefix, 'Delimiter': '/', 'MaxKeys': page_size}
+    if continuation_token:
+        params['ContinuationToken'] = continuation_token
+    response = s3_client.list_objects_v2(**params)
+
+    directories = [entry['Prefix'] for entry in response.get('CommonPrefixes', [])]
+    files = []
+    for obj in response.get('Contents', []):
+        file = parse_file(obj, prefix)
+        if file is not None:
+            files.append(file)
+
+    next_token = response.get('NextContinuationToken') if response.get('IsTruncated') else None
+    return directories, files, next_token
+
+
+def get_folder_level(s3_client, bucket, prefix, page_size, continuation_token=None):
+    """`list_folder_level`, cached for REPORTS_LIST_CACHE_TTL seconds."""
+    if settings.REPORTS_LIST_CACHE_TTL <= 0:
+        return list_folder_level(s3_client, bucket, prefix, page_size, continuation_token)
+
+    digest = hashlib.sha256(f'{bucket}/{prefix}|{page_size}|{continuation_token or ""}'.encode()).hexdigest()
+    cache_key = f'reports:level:{digest}'
+    level = cache.get(cache_key)
+    if level is None:
+        level = list_folder_level(s3_client, bucket, prefix, page_size, continuation_token)
+        cache.set(cache_key, level, timeout=settings.REPORTS_LIST_CACHE_TTL)
+    return level
+
+
+_presigned_urls = None
+_presigned_urls_lock = threading.Lock()
+
+
+def _get_presigned_url_cache():
+    global _presigned_urls
+    if _presigned_urls is None:
+        with _presigned_urls_lock:
+            if _presigned_urls is None:
+                _presigned_urls = TTLCache(maxsize=settings.REPORTS_PRESIGN_CACHE_SIZE)
+    return _presigned_urls
+
+
+def get_presigned_url(s3_client, bucket, key):
+    """
+    Presigned GET URL for `key`. Issued URLs are reused until less than
+    REPORTS_PRESIGN_MIN_REMAINING seconds of validity are left, so hot
+    reports are signed once instead of on every click. Callers must have
+    authorized the key already.
+    """
+    urls = _get_presigned_url_cache()
+    url = urls.get((bucket, key))
+    if url is None:
+        url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=settings.REPORTS_PRESIGN_EXPIRES
+        )
+        urls.set((bucket, key), url, ttl=settings.REPORTS_PRESIGN_EXPIRES - settings.REPORTS_PRESIGN_MIN_REMAINING)
+    return url
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_listing_executor():
+    """
+    Process-wide pool used to list folders concurrently. It is shared by
+    all requests, so REPORTS_LIST_MAX_WORKERS bounds the number of
+    in-flight S3 calls per gunicorn worker.
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            # Threads do not survive fork(), build a new pool in each worker
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.REPORTS_LIST_MAX_WORKERS,
+                    thread_name_prefix='report-list',
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _listing_cache_key(bucket, prefix):
+    # Prefixes may contain spaces or be longer than some cache backends allow
+    digest = hashlib.sha256(f'{bucket}/{prefix}'.encode()).hexdigest()
+    return f'reports:listing:{digest}'
+
+
+def _store_listing(cache_key, files):
+    entry = {'files': files, 'fetched_at': time.time()}
+    timeout = settings.REPORTS_LIST_CACHE_TTL + settings.REPORTS_LIST_CACHE_STALE
+    cache.set(cache_key, entry, timeout=timeout)
+    return entry
+
+
+def _refresh_listing(s3_client, bucket, prefix, cache_key, lock_key):
+    try:
+        _store_listing(cache_key, list_folder_files(s3_client, bucket, prefix))
+    except Exception as e:
+        # Keep serving the stale entry, the next request retries
+        logger.warning("Background refresh of %s failed: %s", prefix, e)
+    finally:
+        cache.delete(lock_key)
+
+
+def peek_folder_files(bucket, prefix):
+    """Cached files of `prefix` (fresh or stale) without listing S3, None if not cached."""
+    entry = cache.get(_listing_cache_key(bucket, prefix))
+    return entry['files'] if entry is not None else None
+
+
+def get_folder_files(s3_client, bucket, prefix):
+    """
+    Files under `prefix`, cached for REPORTS_LIST_CACHE_TTL seconds.
+
+    Entries are keyed by bucket and prefix, so every user whose folders
+    share a prefix shares the listing. Once the TTL has passed the stale
+    files are still served (for up to REPORTS_LIST_CACHE_STALE seconds)
+    while a single background refresh runs; the refresh lock lives in the
+    cache, so with a shared cache backend only one worker refreshes.
+    """
+    if settings.REPORTS_LIST_CACHE_TTL <= 0:
+        return list_folder_files(s3_client, bucket, prefix)
+
+    cache_key = _listing_cache_key(bucket, prefix)
+    entry = cache.get(cache_key)
+    if entry is None:
+        return _store_listing(cache_key, list_folder_files(s3_client, bucket, prefix))['files']
+
+    if time.time() - entry['fetched_at'] > settings.REPORTS_LIST_CACHE_TTL:
+        lock_key = f'{cache_key}:refresh'
+        if cache.add(lock_key, 1, timeout=settings.REPORTS_LIST_TIMEOUT * 2):
+            get_listing_executor().submit(_refresh_listing, s3_client, bucket, prefix, cache_key, lock_key)
+    return entry['files']
@@ -0,0 +1,108 @@
+"""
+Maintenance of the per-folder aggregates in `ReportFolderSummary`.
+
+Full syncs already hold the whole listing and rebuild the summary from
+it. Incremental syncs and S3 events only apply the difference (files
+added or removed, size changes); the newest file is looked up again,
+with one index-backed single-row query, only when the current newest
+file was removed or rewritten.
+"""
+from django.db import transaction
+
+from .models import ReportFolder, ReportFolderSummary, ReportObject
+
+
+class SummaryDelta:
+    def __init__(self):
+        self.count = 0
+        self.size = 0
+        self.newest = None
+        self.touched_keys = set()
+
+    def add(self, obj):
+        """A file that did not exist before."""
+        self.count += 1
+        self.size += obj.size
+        self._candidate(obj)
+
+    def update(self, obj, previous_size):
+        """A new version of an existing file."""
+        self.size += obj.size - previous_size
+        self.touched_keys.add(obj.key)
+        self._candidate(obj)
+
+    def remove(self, key, size):
+        self.count -= 1
+        self.size -= size
+        self.touched_keys.add(key)
+
+    def _candidate(self, obj):
+        if self.newest is None or (obj.last_modified, obj.key) > (self.newest.last_modified, self.newest.key):
+            self.newest = obj
+
+
+def _newest(folder_id):
+    # Served by the (folder, -last_modified, -id) index
+    return (
+        ReportObject.objects
+        .filter(folder_id=folder_id)
+        .order_by('-last_modified', '-id')
+        .only('key', 'last_modified')
+        .first()
+    )
+
+
+def lock_summaries(folder_ids):
+    """
+    Lock the summaries of `folder_ids` until the transaction ends, in
+    folder order. Index writers (sync, S3 events) take it before reading
+    which keys already exist, so two of them never count the same file.
+    The folders' rows are locked, not the summaries: a folder has one
+    before its first summary is written.
+    """
+    list(
+        ReportFolder.objects
+        .select_for_update()
+        .filter(id__in=folder_ids)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+def rebuild_summary(folder_id, objects):
+    """Replace the summary of a folder with the aggregates of `objects` (all of its files)."""
+    objects = list(objects)
+    newest = max(objects, key=lambda obj: (obj.last_modified, obj.key), default=None)
+    ReportFolderSummary.objects.update_or_create(
+        folder_id=folder_id,
+        defaults={
+            'file_count': len(objects),
+            'total_size': sum(obj.size for obj in objects),
+            'newest_last_modified': newest.last_modified if newest else None,
+            'newest_key': newest.key if newest else '',
+        },
+    )
+
+
+def apply_delta(folder_id, delta):
+    """Apply a SummaryDelta; call after the index rows were written, in the same transaction."""
+    with transaction.atomic():
+        summary = ReportFolderSummary.objects.select_for_update().filter(folder_id=folder_id).first()
+        if summary is None:
+            # Never summarized: start from the index rather than from zero
+            rebuild_summary(folder_id, ReportObject.objects.filter(folder_id=folder_id).only('key', 'size', 'last_modified'))
+            return
+
+        summary.file_count = max(0, summary.file_count + delta.count)
+        summary.total_size = max(0, summary.total_size + delta.size)
+        if summary.newest_key in delta.touched_keys:
+            newest = _newest(folder_id)
+            summary.newest_key = newest.key if newest else ''
+            summary.newest_last_modified = newest.last_modified if newest else None
+        elif delta.newest is not None and (
+            summary.newest_last_modified is None
+            or (delta.newest.last_modified, delta.newest.key) > (summary.newest_last_modified, summary.newest_key)
+        ):
+            summary.newest_key = delta.newest.key
+            summary.newest_last_modified = delta.newest.last_modified
+        summary.save()
@@ -1,7 +1,30 @@
 from django.urls import path
-from .views import ReportListView, GeneratePresignedUrlView
+from .views import (
+    ReportListView,
+    ReportSummaryView,
+    ReportStreamView,
+    ReportChangesView,
+    ReportFilesView,
+    ReportBrowseView,
+    GeneratePresignedUrlView,
+    BatchPresignedUrlView,
+    ReportFileView,
+    ReportArchiveView,
+    ReportPreviewView,
+    ReportEventsView,
+)
 
 urlpatterns = [
     path('list/', ReportListView.as_view(), name='report-list'),
+    path('summary/', ReportSummaryView.as_view(), name='report-summary'),
+    path('changes/', ReportChangesView.as_view(), name='report-changes'),
+    path('stream/', ReportStreamView.as_view(), name='report-stream'),
+    path('files/', ReportFilesView.as_view(), name='report-files'),
+    path('browse/', ReportBrowseView.as_view(), name='report-browse'),
     path('download/', GeneratePresignedUrlView.as_view(), name='report-download'),
+    path('download/batch/', BatchPresignedUrlView.as_view(), name='report-download-batch'),
+    path('download/file/', ReportFileView.as_view(), name='report-download-file'),
+    path('download/zip/', ReportArchiveView.as_view(), name='report-download-zip'),
+    path('preview/', ReportPreviewView.as_view(), name='report-preview'),
+    path('events/', ReportEventsView.as_view(), name='report-events'),
 ]
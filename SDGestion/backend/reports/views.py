@@ -1,18 +1,72 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework import status
-from .models import ReportFolder
+from .models import ReportFolder, ReportFolderSummary
 from django.conf import settings
-import boto3
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from authentication.authentication import SupabaseAuthentication
+from django.utils import timezone
 from botocore.exceptions import ClientError
+from common.clients import get_s3_client
+from common.conditional import not_modified, set_validators
+from common.cursors import InvalidCursor, decode_cursor, encode_cursor
+from common.singleflight import single_flight
+from .access import get_access_index
+from .archive import stream_zip
+from .broadcast import get_broadcaster
+from .changes import CursorExpired, current_cursor, list_changes
+from . import diskcache
+from .events import InvalidEvent, ingest
+from .filters import FileFilter, InvalidFilter
+from .index import indexed_rows, is_indexed, list_indexed_page
+from .listing import list_folders, listing_fingerprint, listing_key, stream_folders_json
+from .preview import PreviewUnavailable, get_preview
+from .storage import get_folder_files, get_folder_level, get_presigned_url, list_folder_page
+import asyncio
+import hmac
+import json
 import logging
 import mimetypes
+import posixpath
 import traceback
+from urllib.parse import urlencode
 
 logger = logging.getLogger(__name__)
 
+VALID_ROLES = [role for role, _ in ReportFolder.ROLE_CHOICES]
+
+
+class PlainTextJSONParser(JSONParser):
+    # SNS posts its JSON notifications as text/plain
+    media_type = 'text/plain'
+
+
+def download_url(request, s3_client, key):
+    """URL handed out for an authorized key: presigned S3, or the disk-cached proxy (REPORTS_PROXY_DOWNLOADS)."""
+    if settings.REPORTS_PROXY_DOWNLOADS:
+        path = reverse('report-download-file') + '?' + urlencode({'token': diskcache.make_file_token(key)})
+        return request.build_absolute_uri(path)
+    return get_presigned_url(s3_client, settings.AWS_STORAGE_BUCKET_NAME, key)
+
+
 class ReportListView(APIView):
+    """
+    GET: Every folder visible to the user with its files.
+    `?stream=1` (or REPORTS_LIST_STREAM) streams the same JSON document.
+    Files can be filtered, sorted and limited per folder with `since`,
+    `until`, `q`, `ext`, `min_size`, `max_size`, `sort` and `limit`
+    (see reports/filters.py).
+    Sends an ETag (no Last-Modified: removals do not advance it) and answers 304 when the client's copy is current.
+    The X-Reports-Cursor header is the cursor to poll api/reports/changes/ with.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -29,117 +83,215 @@ class ReportListView(APIView):
                  print("DEBUG: Missing company/role", flush=True)
                  return Response({"error": "User profile incomplete"}, status=status.HTTP_403_FORBIDDEN)
 
-            # Base filter: Company must match
-            folders = ReportFolder.objects.filter(company=company)
-
-            # Role filter
-            if role == 'Tienda':
-                 folders = folders.filter(role_required='Tienda')
-            elif role == 'Comercial':
-                 folders = folders.filter(role_required__in=['Tienda', 'Comercial'])
-            elif role == 'Admin':
-                 pass # Sees all roles within company
-            else:
+            if role not in VALID_ROLES:
                  return Response({"error": "Invalid Role"}, status=status.HTTP_403_FORBIDDEN)
-            
-            print(f"DEBUG: Found {folders.count()} folders for user", flush=True)
 
-            # Initialize S3 Client Explicitly
             try:
-                print("DEBUG: Initializing Boto3 Client...", flush=True)
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=settings.AWS_S3_REGION_NAME
-                )
-                print("DEBUG: Boto3 Client initialized successfully", flush=True)
-            except Exception as e:
-                print(f"CRITICAL: Failed to init boto3: {e}", flush=True)
-                return Response({"error": f"Server Configuration Error: {str(e)}"}, status=500)
+                filters = FileFilter.from_query(request.query_params)
+            except InvalidFilter as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Check settings
-            if not settings.AWS_STORAGE_BUCKET_NAME:
-                print("CRITICAL: AWS_STORAGE_BUCKET_NAME is not set!", flush=True)
-                return Response({"error": "Server Misconfiguration: AWS_STORAGE_BUCKET_NAME missing"}, status=500)
+            # Cached per (company, role): no folder query in steady state
+            folders = get_access_index(company, role).folders
+            
+            print(f"DEBUG: Found {len(folders)} folders for user", flush=True)
 
-            results = []
-            for folder in folders:
-                print(f"DEBUG: Processing folder {folder.name} (Prefix: {folder.s3_prefix})", flush=True)
-                folder_data = {
-                    "id": folder.id,
-                    "name": folder.name, 
-                    "files": []
-                }
-                
+            if not all(is_indexed(folder) for folder in folders):
+                # Shared S3 client (created once per process)
                 try:
-                    # List objects in the bucket
-                    print(f"DEBUG: Listing bucket={settings.AWS_STORAGE_BUCKET_NAME} prefix={folder.s3_prefix}", flush=True)
-                    response = s3_client.list_objects_v2(
-                        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                        Prefix=folder.s3_prefix
-                    )
-
-                    file_count = 0
-                    if 'Contents' in response:
-                        for obj in response['Contents']:
-                            key = obj['Key']
-                            
-                            # Skip exact match of the folder prefix itself (empty placeholder)
-                            if key == folder.s3_prefix or key == folder.s3_prefix + '/':
-                                continue
-                                
-                            filename = key.split('/')[-1]
-                            if not filename: 
-                                continue
-
-                            # Safely get LastModified and Size
-                            last_modified = obj.get('LastModified')
-                            size = obj.get('Size', 0)
-
-                            # Explicitly convert datetime to string for JSON serialization
-                            if last_modified:
-                                last_modified = str(last_modified)
-
-                            folder_data["files"].append({
-                                "name": filename,
-                                "key": key,
-                                "last_modified": last_modified,
-                                "size": size
-                            })
-                            file_count += 1
-                    
-                    print(f"DEBUG: Found {file_count} files in {folder.name}", flush=True)
-
-                    # Sort files 
-                    folder_data["files"].sort(key=lambda x: x['last_modified'], reverse=True)
-                    results.append(folder_data)
-
-                except ClientError as e:
-                    print(f"ERROR: S3 ClientError for {folder.name}: {e}", flush=True)
-                    results.append({
-                        "id": folder.id,
-                        "name": f"{folder.name} (ACCESS ERROR)",
-                        "files": [],
-                        "error": str(e)
-                    })
+                    get_s3_client()
                 except Exception as e:
-                    print(f"ERROR: Generic error for {folder.name}: {e}", flush=True)
-                    traceback.print_exc()
-                    results.append({
-                        "id": folder.id,
-                        "name": f"{folder.name} (ERROR)",
-                        "files": [],
-                        "error": str(e)
-                    })
-            
-            return Response(results)
+                    print(f"CRITICAL: Failed to init boto3: {e}", flush=True)
+                    return Response({"error": f"Server Configuration Error: {str(e)}"}, status=500)
+
+                # Check settings
+                if not settings.AWS_STORAGE_BUCKET_NAME:
+                    print("CRITICAL: AWS_STORAGE_BUCKET_NAME is not set!", flush=True)
+                    return Response({"error": "Server Misconfiguration: AWS_STORAGE_BUCKET_NAME missing"}, status=500)
+
+            # Checked before any listing work: unchanged folders cost one aggregate query
+            etag = listing_fingerprint(folders, filters)
+            if etag:
+                response = not_modified(request, etag)
+                if response is not None:
+                    return response
+
+            if settings.REPORTS_LIST_STREAM or request.query_params.get('stream') in ('1', 'true'):
+                # Encoded while listed: flat memory and an early first byte for huge companies
+                response = StreamingHttpResponse(stream_folders_json(folders, filters), content_type='application/json')
+                response['X-Reports-Cursor'] = current_cursor()
+                if etag:
+                    set_validators(response, etag)
+                return response
+
+            # Concurrent requests for the same folder set share one computation.
+            # The cursor is read with the listing it describes, never after it.
+            cursor, results = single_flight(
+                listing_key(company, folders, filters),
+                lambda: (current_cursor(), list_folders(folders, filters)),
+                timeout=settings.REPORTS_LIST_TIMEOUT + 5,
+            )
+            response = Response(results)
+            response['X-Reports-Cursor'] = cursor
+            if etag:
+                set_validators(response, etag)
+            return response
 
         except Exception as main_e:
             print("CRITICAL: Unhandled exception in ReportListView", flush=True)
             traceback.print_exc()
             return Response({"error": f"Internal Server Error: {str(main_e)}"}, status=500)
 
+class ReportSummaryView(APIView):
+    """
+    GET: File count, total size and newest file of every visible folder,
+    from the precomputed ReportFolderSummary rows (one small query, no
+    listing). Folders never synced report zeros.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            if not company or not role:
+                 return Response({"error": "User profile incomplete"}, status=status.HTTP_403_FORBIDDEN)
+
+            folders = get_access_index(company, role).folders
+            summaries = ReportFolderSummary.objects.in_bulk([folder.id for folder in folders])
+
+            results = []
+            for folder in folders:
+                summary = summaries.get(folder.id)
+                results.append({
+                    "id": folder.id,
+                    "name": folder.name,
+                    "file_count": summary.file_count if summary else 0,
+                    "total_size": summary.total_size if summary else 0,
+                    "newest_last_modified": str(summary.newest_last_modified) if summary and summary.newest_last_modified else None,
+                    "newest_key": summary.newest_key if summary and summary.newest_key else None,
+                })
+            return Response(results)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
+def _sse_event(change):
+    if change.action == change.ADDED:
+        data = {"folder": change.folder_id, **change.as_file()}
+    else:
+        data = {"folder": change.folder_id, "key": change.key, "name": change.name}
+    return f"event: {change.action}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _report_events(folder_ids):
+    loop = asyncio.get_running_loop()
+    broadcaster = get_broadcaster()
+    subscription = broadcaster.subscribe(folder_ids)
+    closes_at = loop.time() + settings.REPORTS_SSE_MAX_AGE
+    try:
+        yield "retry: 5000\n\n"
+        while loop.time() < closes_at:
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), timeout=settings.REPORTS_SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+                continue
+            if change is None:
+                # Too far behind: the client reconnects and catches up with api/reports/changes/
+                break
+            yield _sse_event(change)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+class ReportStreamView(View):
+    """
+    GET: Server-Sent Events stream of files added to ("added") or removed
+    from ("removed") the folders visible to the user, same data as the
+    delta API. Events may repeat: clients apply them by key.
+
+    EventSource cannot set headers, so the Supabase access token may be
+    sent as `?access_token=`. Served by the ASGI events process
+    (config/asgi.py): every connection is a coroutine waiting on an
+    in-process queue, fed by one change-log poller per process
+    (reports/broadcast.py). Under WSGI a connection would hold a worker
+    thread for up to REPORTS_SSE_MAX_AGE, so it is refused there.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"error": "The event stream is served by the events server"}, status=404)
+        token = request.GET.get('access_token')
+        auth_header = request.headers.get('Authorization', '')
+        if not token and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ', 1)[1]
+        if not token:
+            return JsonResponse({"error": "Authentication credentials were not provided."}, status=401)
+
+        try:
+            user, _ = await sync_to_async(SupabaseAuthentication().authenticate_token)(request, token)
+        except AuthenticationFailed as e:
+            return JsonResponse({"error": str(e.detail)}, status=401)
+
+        company = getattr(user, 'company', None)
+        role = getattr(user, 'role', None)
+        if not company or not role:
+            return JsonResponse({"error": "User profile incomplete"}, status=403)
+        if role not in VALID_ROLES:
+            return JsonResponse({"error": "Invalid Role"}, status=403)
+
+        access = await sync_to_async(get_access_index)(company, role)
+        response = StreamingHttpResponse(
+            _report_events([folder.id for folder in access.folders]),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # nginx would otherwise buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ReportChangesView(APIView):
+    """
+    GET: Files added to or removed from the visible folders since `cursor`
+    (the X-Reports-Cursor of a listing or the `cursor` of a previous call).
+
+    Returns {"added": [...], "removed": [...], "cursor": ..., "has_more": ...};
+    410 when the cursor is older than the change log retention.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            if not company or not role:
+                 return Response({"error": "User profile incomplete"}, status=status.HTTP_403_FORBIDDEN)
+
+            cursor = request.query_params.get('cursor')
+            if not cursor:
+                return Response({"error": "Missing 'cursor' parameter"}, status=status.HTTP_400_BAD_REQUEST)
+
+            folder_ids = [folder.id for folder in get_access_index(company, role).folders]
+            try:
+                delta = list_changes(folder_ids, cursor, settings.REPORTS_CHANGES_PAGE_SIZE)
+            except InvalidCursor as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except CursorExpired as e:
+                return Response({"error": str(e)}, status=status.HTTP_410_GONE)
+            return Response(delta)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
 class GeneratePresignedUrlView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -153,31 +305,430 @@ class GeneratePresignedUrlView(APIView):
             company = getattr(user, 'company', None)
             role = getattr(user, 'role', None)
 
-            # Re-verify permissions (simplified for now to rely on Filter overlap)
-            # Fetch all user allowed folders
-            folders = ReportFolder.objects.filter(company=company)
-            is_allowed = False
-            for folder in folders:
-                 if key.startswith(folder.s3_prefix):
-                     is_allowed = True
-                     break
-            
-            if not is_allowed and role != 'Admin': # Allow admin override just in case
+            # Same company/role rules as the listing
+            if not get_access_index(company, role).allows(key):
                  return Response({"error": "Unauthorized"}, status=403)
 
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME
+            url = download_url(request, get_s3_client(), key)
+            return Response({"url": url})
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
+class BatchPresignedUrlView(APIView):
+    """
+    POST: Presigned URLs for several keys in one round trip.
+
+    Body: {"keys": ["dkohome/Ventas/a.csv", ...]} (at most REPORTS_PRESIGN_BATCH_MAX).
+    Returns {"urls": {key: url}, "errors": {key: message}}; keys are
+    authorized against the cached access index, without DB queries.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            keys = request.data.get('keys') if isinstance(request.data, dict) else None
+            if not isinstance(keys, list) or not keys or not all(isinstance(k, str) and k for k in keys):
+                return Response({"error": "'keys' must be a non-empty list of keys"}, status=status.HTTP_400_BAD_REQUEST)
+            if len(keys) > settings.REPORTS_PRESIGN_BATCH_MAX:
+                return Response({"error": f"At most {settings.REPORTS_PRESIGN_BATCH_MAX} keys per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            access = get_access_index(company, role)
+            s3_client = get_s3_client()
+
+            urls = {}
+            errors = {}
+            for key in dict.fromkeys(keys):
+                if not access.allows(key):
+                    errors[key] = "Unauthorized"
+                    continue
+                urls[key] = download_url(request, s3_client, key)
+
+            return Response({"urls": urls, "errors": errors})
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+class ReportFileView(APIView):
+    """
+    GET: Proxied download of one report (REPORTS_PROXY_DOWNLOADS).
+
+    `token` is the signed key handed out by the download endpoints, so
+    the link works without an Authorization header, like a presigned URL.
+    A current copy in the disk cache is sent with FileResponse (sendfile
+    under gunicorn); otherwise the client is redirected to S3 and the
+    object is cached in the background. See reports/diskcache.py.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        try:
+            key = diskcache.load_file_token(request.query_params.get('token', ''))
+        except signing.BadSignature:
+            return Response({"error": "Invalid or expired link"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            s3_client = get_s3_client()
+            bucket = settings.AWS_STORAGE_BUCKET_NAME
+
+            cached = diskcache.lookup(key)
+            if cached is None:
+                diskcache.fill_async(s3_client, bucket, key)
+            else:
+                try:
+                    new_version = diskcache.revalidate(s3_client, bucket, cached)
+                except ClientError as e:
+                    if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+                    # S3 unavailable: the copy we have is better than an error
+                    logger.warning("Could not revalidate %s, serving cached copy: %s", key, e)
+                    new_version = None
+
+                if new_version is None:
+                    response = not_modified(request, cached.etag)
+                    if response is not None:
+                        return response
+                    data = diskcache.open_data(cached)
+                    if data is not None:
+                        diskcache.touch(cached)
+                        response = FileResponse(
+                            data,
+                            as_attachment=True,
+                            filename=posixpath.basename(key),
+                            content_type=cached.content_type,
+                        )
+                        return set_validators(response, cached.etag)
+                    # Evicted since the lookup: serve from S3
+                else:
+                    # Changed in S3: cache the new version from the response we already have
+                    diskcache.fill_async(s3_client, bucket, key, new_version)
+
+            return HttpResponseRedirect(get_presigned_url(s3_client, bucket, key))
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
+class ReportArchiveView(APIView):
+    """
+    POST: Stream a ZIP of several reports, built on the fly from S3.
+
+    Body: {"keys": [...]} or {"folder": id, "since": ..., "until": ...}
+    (a folder accepts the same filters as the listing). At most
+    REPORTS_ZIP_MAX_FILES files; every key is authorized with the same
+    access index as GeneratePresignedUrlView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            if not company or not role:
+                 return Response({"error": "User profile incomplete"}, status=status.HTTP_403_FORBIDDEN)
+
+            data = request.data if isinstance(request.data, dict) else {}
+            access = get_access_index(company, role)
+
+            if 'keys' in data:
+                keys = data['keys']
+                if not isinstance(keys, list) or not keys or not all(isinstance(k, str) and k for k in keys):
+                    return Response({"error": "'keys' must be a non-empty list of keys"}, status=status.HTTP_400_BAD_REQUEST)
+                keys = list(dict.fromkeys(keys))
+                unauthorized = [key for key in keys if not access.allows(key)]
+                if unauthorized:
+                    return Response({"error": "Unauthorized", "keys": unauthorized}, status=403)
+            elif 'folder' in data:
+                try:
+                    folder_id = int(data['folder'])
+                except (TypeError, ValueError):
+                    return Response({"error": "'folder' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+                folder = access.folder(folder_id)
+                if folder is None:
+                    return Response({"error": "Folder not found"}, status=status.HTTP_404_NOT_FOUND)
+                try:
+                    filters = FileFilter.from_query(data)
+                except InvalidFilter as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+                if is_indexed(folder):
+                    keys = [obj.key for obj in indexed_rows([folder], filters)[:settings.REPORTS_ZIP_MAX_FILES + 1]]
+                else:
+                    files = get_folder_files(get_s3_client(), settings.AWS_STORAGE_BUCKET_NAME, folder.s3_prefix)
+                    keys = [file['key'] for file in filters.apply_files(files)]
+                if not keys:
+                    return Response({"error": "No files match"}, status=status.HTTP_404_NOT_FOUND)
+            else:
+                return Response({"error": "Send 'keys' or 'folder'"}, status=status.HTTP_400_BAD_REQUEST)
+
+            if len(keys) > settings.REPORTS_ZIP_MAX_FILES:
+                return Response(
+                    {"error": f"At most {settings.REPORTS_ZIP_MAX_FILES} files per archive, narrow the selection"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # "<folder name>/<path under the folder prefix>" inside the archive
+            entries = []
+            for key in keys:
+                folder = access.longest_match(key)
+                entries.append((key, f"{folder.name}/{key[len(folder.s3_prefix):].lstrip('/')}"))
+
+            filename = f"reportes-{timezone.localdate():%Y%m%d}.zip"
+            response = StreamingHttpResponse(
+                stream_zip(get_s3_client(), settings.AWS_STORAGE_BUCKET_NAME, entries),
+                content_type='application/zip',
             )
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        except ClientError as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
+class ReportPreviewView(APIView):
+    """
+    GET: Header and first rows of a CSV/XLSX report without downloading it.
+
+    Query params: `key` and `rows` (default REPORTS_PREVIEW_ROWS, at most
+    REPORTS_PREVIEW_MAX_ROWS). Authorized like GeneratePresignedUrlView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            key = request.query_params.get('key')
+            if not key:
+                 return Response({"error": "Missing 'key' parameter"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                rows = int(request.query_params.get('rows', settings.REPORTS_PREVIEW_ROWS))
+            except ValueError:
+                return Response({"error": "'rows' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= rows <= settings.REPORTS_PREVIEW_MAX_ROWS:
+                return Response({"error": f"'rows' must be between 1 and {settings.REPORTS_PREVIEW_MAX_ROWS}"}, status=status.HTTP_400_BAD_REQUEST)
+
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            if not get_access_index(company, role).allows(key):
+                 return Response({"error": "Unauthorized"}, status=403)
+
+            try:
+                preview = get_preview(get_s3_client(), settings.AWS_STORAGE_BUCKET_NAME, key, rows)
+            except PreviewUnavailable as e:
+                return Response({"error": str(e)}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+            return Response(preview)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
 
-            url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key},
-                ExpiresIn=3600
+class ReportFilesView(APIView):
+    """
+    GET: One page of the files of a folder.
+
+    Query params: `folder` (id), `page_size` (default REPORTS_PAGE_SIZE,
+    at most REPORTS_MAX_PAGE_SIZE) and `cursor` (the `next_cursor` of the
+    previous page). The cost of a request is bounded by the page size,
+    whatever the size of the folder.
+
+    Served from the object index (newest first across the whole folder)
+    or, with REPORTS_LIST_SOURCE='s3' and for folders never synced, from
+    S3 in key order.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            if not company or not role:
+                 return Response({"error": "User profile incomplete"}, status=status.HTTP_403_FORBIDDEN)
+
+            try:
+                folder_id = int(request.query_params.get('folder', ''))
+                page_size = int(request.query_params.get('page_size', settings.REPORTS_PAGE_SIZE))
+            except ValueError:
+                return Response({"error": "'folder' and 'page_size' must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= page_size <= settings.REPORTS_MAX_PAGE_SIZE:
+                return Response({"error": f"'page_size' must be between 1 and {settings.REPORTS_MAX_PAGE_SIZE}"}, status=status.HTTP_400_BAD_REQUEST)
+
+            folder = get_access_index(company, role).folder(folder_id)
+            if folder is None:
+                return Response({"error": "Folder not found"}, status=status.HTTP_404_NOT_FOUND)
+
+            position = None
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                try:
+                    data = decode_cursor(cursor)
+                except InvalidCursor as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                if data.get('folder') != folder.id:
+                    return Response({"error": "Cursor does not belong to this folder"}, status=status.HTTP_400_BAD_REQUEST)
+                position = data.get('after') or data.get('token')
+
+            if is_indexed(folder):
+                # Globally sorted by last_modified, keyset-paginated in the database
+                if position is not None and not isinstance(position, dict):
+                    return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    files, next_position = list_indexed_page(folder, page_size, position)
+                except InvalidCursor as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                next_cursor = encode_cursor({"folder": folder.id, "after": next_position}) if next_position else None
+            else:
+                if position is not None and not isinstance(position, str):
+                    return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+                files, next_token = list_folder_page(
+                    get_s3_client(),
+                    settings.AWS_STORAGE_BUCKET_NAME,
+                    folder.s3_prefix,
+                    page_size,
+                    position,
+                )
+                next_cursor = encode_cursor({"folder": folder.id, "token": next_token}) if next_token else None
+
+            return Response({
+                "id": folder.id,
+                "name": folder.name,
+                "files": files,
+                "next_cursor": next_cursor,
+            })
+        except ClientError as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+class ReportBrowseView(APIView):
+    """
+    GET: One level of a folder's tree, for lazy drill-down.
+
+    Query params: `folder` (id), `path` (sub-path under the folder prefix,
+    e.g. "2024/enero/"; empty for the top), `page_size` and `cursor`.
+    Returns the immediate sub-directories ({"name", "path"}) and the files
+    directly under `path`; only that level is listed in S3.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            company = getattr(user, 'company', None)
+            role = getattr(user, 'role', None)
+
+            if not company or not role:
+                 return Response({"error": "User profile incomplete"}, status=status.HTTP_403_FORBIDDEN)
+
+            try:
+                folder_id = int(request.query_params.get('folder', ''))
+                page_size = int(request.query_params.get('page_size', settings.REPORTS_PAGE_SIZE))
+            except ValueError:
+                return Response({"error": "'folder' and 'page_size' must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= page_size <= settings.REPORTS_MAX_PAGE_SIZE:
+                return Response({"error": f"'page_size' must be between 1 and {settings.REPORTS_MAX_PAGE_SIZE}"}, status=status.HTTP_400_BAD_REQUEST)
+
+            folder = get_access_index(company, role).folder(folder_id)
+            if folder is None:
+                return Response({"error": "Folder not found"}, status=status.HTTP_404_NOT_FOUND)
+
+            # Always below the folder prefix: no absolute paths, no '..' segments
+            segments = [segment for segment in request.query_params.get('path', '').split('/') if segment]
+            if any(segment in ('.', '..') for segment in segments):
+                return Response({"error": "Invalid 'path'"}, status=status.HTTP_400_BAD_REQUEST)
+            path = ''.join(f'{segment}/' for segment in segments)
+            base = folder.s3_prefix if folder.s3_prefix.endswith('/') else folder.s3_prefix + '/'
+            prefix = base + path
+
+            token = None
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                try:
+                    data = decode_cursor(cursor)
+                except InvalidCursor as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                if data.get('folder') != folder.id or data.get('path') != path or not isinstance(data.get('token'), str):
+                    return Response({"error": "Cursor does not belong to this path"}, status=status.HTTP_400_BAD_REQUEST)
+                token = data['token']
+
+            directories, files, next_token = get_folder_level(
+                get_s3_client(),
+                settings.AWS_STORAGE_BUCKET_NAME,
+                prefix,
+                page_size,
+                token,
             )
-            return Response({"url": url})
+
+            return Response({
+                "id": folder.id,
+                "name": folder.name,
+                "path": path,
+                "directories": [
+                    {"name": directory[len(prefix):].rstrip('/'), "path": directory[len(base):]}
+                    for directory in directories
+                ],
+                "files": files,
+                "next_cursor": encode_cursor({"folder": folder.id, "path": path, "token": next_token}) if next_token else None,
+            })
+        except ClientError as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
         except Exception as e:
             traceback.print_exc()
             return Response({"error": str(e)}, status=500)
+
+class HasReportEventsToken(BasePermission):
+    """
+    Event sources are not Supabase users: they authenticate with the shared
+    REPORTS_EVENTS_TOKEN, sent in the X-Events-Token header or, for senders
+    that cannot set headers (SNS HTTPS subscriptions), the `token` query param.
+    """
+    def has_permission(self, request, view):
+        expected = settings.REPORTS_EVENTS_TOKEN
+        if not expected:
+            return False
+        provided = request.headers.get('X-Events-Token') or request.query_params.get('token', '')
+        return hmac.compare_digest(provided.encode(), expected.encode())
+
+
+class ReportEventsView(APIView):
+    """
+    POST: Apply S3 ObjectCreated/ObjectRemoved notifications to the report index.
+    Accepts raw S3 events and SNS/SQS-wrapped ones (see reports/events.py).
+    """
+    authentication_classes = []
+    permission_classes = [HasReportEventsToken]
+    parser_classes = [JSONParser, PlainTextJSONParser]
+
+    def post(self, request):
+        payload = request.data
+        if isinstance(payload, dict) and payload.get('Type') == 'SubscriptionConfirmation':
+            # Confirm the SNS subscription by visiting SubscribeURL once
+            logger.warning("SNS subscription confirmation received: %s", payload.get('SubscribeURL'))
+            return Response({"message": "Subscription confirmation logged"})
+
+        try:
+            stats = ingest(payload)
+        except (InvalidEvent, KeyError, TypeError) as e:
+            return Response({"error": f"Invalid event payload: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats)
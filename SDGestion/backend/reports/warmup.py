@@ -0,0 +1,101 @@
+"""
+Cache warm-up for report listings and authorization.
+
+Builds the shared S3 (and Supabase) clients, the access index of every
+(company, role) pair of ReportFolder.COMPANY_CHOICES x ROLE_CHOICES and
+the listing of every folder they can see, so the first requests after a
+deploy do not pay for cold caches. Folders are listed at most `workers`
+at a time.
+
+The access indexes and clients live in the process that builds them and
+the S3 listings in the Django cache, so only REPORTS_WARM_ON_START
+(config/gunicorn.conf.py, run in each gunicorn worker) warms all of them.
+`manage.py warm_report_caches` runs in its own process: it can only warm
+the S3 listings, and only when the cache backend is shared between
+processes (see `shared_cache`). Index listings are not cached by the
+app; warming them just reads the folder's rows so the database has them
+in memory.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+from common.clients import get_s3_client, get_supabase_admin_client, get_supabase_client
+
+from .access import get_access_index
+from .index import is_indexed, list_indexed_files
+from .models import ReportFolder
+from .storage import get_folder_files
+
+logger = logging.getLogger(__name__)
+
+
+# Cache backends whose entries are only visible to the process that set them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    """Whether the default Django cache is shared with other processes."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def _warm_folder(s3_client, folder):
+    started = time.monotonic()
+    try:
+        if is_indexed(folder):
+            # Not cached here: reading the rows loads them into the database's buffers
+            count = len(list_indexed_files([folder])[folder.id])
+        else:
+            count = len(get_folder_files(s3_client, settings.AWS_STORAGE_BUCKET_NAME, folder.s3_prefix))
+    finally:
+        # Pool threads are short-lived: do not leave their connections open
+        connections.close_all()
+    return count, time.monotonic() - started
+
+
+def warm_caches(workers=None, companies=None, log=logger.info):
+    """
+    Warm clients, access indexes and folder listings. Returns the number
+    of folders that failed; progress is reported through `log`.
+    """
+    started = time.monotonic()
+    workers = workers or settings.REPORTS_LIST_MAX_WORKERS
+
+    s3_client = get_s3_client()
+    for build in (get_supabase_client, get_supabase_admin_client):
+        try:
+            build()
+        except ImproperlyConfigured:
+            pass
+
+    folders = {}
+    for company, _ in ReportFolder.COMPANY_CHOICES:
+        if companies and company not in companies:
+            continue
+        for role, _ in ReportFolder.ROLE_CHOICES:
+            index = get_access_index(company, role)
+            log(f"Access index {company}/{role}: {len(index.folders)} folder(s)")
+            for folder in index.folders:
+                folders[folder.id] = folder
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-warmup') as executor:
+        pending = [(folder, executor.submit(_warm_folder, s3_client, folder)) for folder in folders.values()]
+        for folder, future in pending:
+            try:
+                count, elapsed = future.result()
+            except Exception as e:
+                failures += 1
+                log(f"✗ {folder.name} ({folder.s3_prefix}): {e}")
+                continue
+            log(f"✓ {folder.name} ({folder.s3_prefix}): {count} files in {elapsed:.2f}s")
+
+    log(f"Warmed {len(folders)} folder(s) in {time.monotonic() - started:.2f}s")
+    return failures
@@ -0,0 +1,374 @@
+"""
+Bulk user import (`POST api/users/import/`) and update (`PATCH api/users/bulk/`).
+
+Rows come as a JSON array or a CSV file with the fields of
+CreateUserSerializer (email, password, company, role and optionally
+can_view_reports / can_view_user_management). The whole import is
+validated before anything is provisioned: one invalid row rejects it.
+
+Valid rows are then created in Supabase auth by a pool of
+USERS_IMPORT_WORKERS threads sharing a RateLimiter of USERS_IMPORT_RATE
+calls per second, the local UserProfile rows are written with one
+bulk_create and the `profiles` rows with batched upserts.
+
+Re-running an import is safe: emails that already have a UserProfile
+(compared case-insensitively, as Supabase does) are skipped, and a
+Supabase account left behind by an interrupted run is reused instead of
+failing on "email exists".
+
+Updates apply a change set to many users with one bulk_update in a
+transaction and push company/role changes to `profiles` with batched
+upserts instead of one request per user.
+"""
+import csv
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from supabase_auth.errors import AuthApiError
+
+from authentication.principals import invalidate_principal
+from common.clients import get_supabase_admin_client
+from common.ratelimit import RateLimiter
+
+from .models import UserProfile
+from .serializers import CreateUserSerializer, UpdateUserSerializer
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+class InvalidRows(ValueError):
+    pass
+
+
+def parse_rows(request):
+    """Rows of a CSV upload (`file`), a text/csv body or a JSON array. Raises InvalidRows."""
+    if request.content_type.startswith('text/csv'):
+        return _parse_csv(request.body)
+    upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+    if upload is not None:
+        return _parse_csv(upload.read())
+
+    rows = request.data
+    if isinstance(rows, dict):
+        rows = rows.get('users')
+    if not isinstance(rows, list):
+        raise InvalidRows("Expected a JSON array of users, a CSV 'file' upload or a text/csv body")
+    return rows
+
+
+def _parse_csv(raw):
+    try:
+        text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise InvalidRows('CSV must be UTF-8 encoded')
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or 'email' not in reader.fieldnames:
+        raise InvalidRows("CSV must have a header row with an 'email' column")
+    # Empty cells fall back to the serializer defaults
+    return [
+        {name: value.strip() for name, value in row.items() if name and value and value.strip()}
+        for row in reader
+    ]
+
+
+class _AuthDirectory:
+    """Email -> id of the Supabase auth users, listed once and only if needed."""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def lookup(self, email):
+        with self._lock:
+            if self._ids is None:
+                self._ids = {}
+                page = 1
+                while True:
+                    users = self.supabase.auth.admin.list_users(page=page, per_page=1000)
+                    for user in users:
+                        if user.email:
+                            self._ids[user.email.lower()] = user.id
+                    if len(users) < 1000:
+                        break
+                    page += 1
+        return self._ids.get(email.lower())
+
+
+def _provision(supabase, limiter, directory, data):
+    """Create the Supabase account of a validated row. Returns its id."""
+    limiter.acquire()
+    try:
+        auth_response = supabase.auth.admin.create_user({
+            "email": data['email'],
+            "password": data['password'],
+            "email_confirm": True,
+        })
+    except AuthApiError as e:
+        if e.code not in ('email_exists', 'user_already_exists'):
+            raise
+        # Left behind by an earlier, interrupted import
+        supabase_user_id = directory.lookup(data['email'])
+        if supabase_user_id is None:
+            raise
+        return supabase_user_id
+    if not auth_response.user:
+        raise RuntimeError('Failed to create user in Supabase')
+    return auth_response.user.id
+
+
+def _upsert_profiles(supabase, profiles):
+    """Upsert `profiles` in batches. Returns {profile id: error} of the batches that failed."""
+    failed = {}
+    for start in range(0, len(profiles), BATCH_SIZE):
+        batch = profiles[start:start + BATCH_SIZE]
+        try:
+            supabase.table('profiles').upsert(batch).execute()
+        except Exception as e:
+            logger.warning("Could not upsert %d Supabase profile(s): %s", len(batch), e)
+            failed.update((profile['id'], str(e)) for profile in batch)
+    return failed
+
+
+def validate_rows(rows):
+    """
+    Validate every row. Returns the per-row results, with status
+    "skipped" (email already imported, in any case), "invalid" (with
+    "errors") or "pending" (with the validated "data", not part of the
+    report).
+    """
+    emails = [row.get('email').lower() for row in rows if isinstance(row, dict) and isinstance(row.get('email'), str)]
+    existing = set(
+        UserProfile.objects
+        .annotate(email_lower=Lower('email'))
+        .filter(email_lower__in=emails)
+        .values_list('email_lower', flat=True)
+    )
+
+    results = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            results.append({"row": number, "status": "invalid", "errors": {"row": ["Expected an object"]}})
+            continue
+        email = row.get('email')
+        result = {"row": number, "email": email}
+        if isinstance(email, str) and email.lower() in existing:
+            result["status"] = "skipped"
+        elif isinstance(email, str) and email.lower() in seen:
+            result.update(status="invalid", errors={"email": ["Duplicate email in this import"]})
+        else:
+            serializer = CreateUserSerializer(data=row, context={'existing_emails': existing})
+            if serializer.is_valid():
+                result.update(status="pending", data=serializer.validated_data)
+            else:
+                result.update(status="invalid", errors=serializer.errors)
+        if isinstance(email, str):
+            seen.add(email.lower())
+        results.append(result)
+    return results
+
+
+def import_users(results):
+    """
+    Provision the "pending" rows of `validate_rows` and fill in their
+    results. A row whose Supabase profile could not be written is
+    "failed" and has no local profile, so importing it again retries it.
+    """
+    pending = [result for result in results if result["status"] == "pending"]
+    if not pending:
+        return results
+
+    supabase = get_supabase_admin_client()
+    limiter = RateLimiter(settings.USERS_IMPORT_RATE, burst=settings.USERS_IMPORT_WORKERS)
+    directory = _AuthDirectory(supabase)
+
+    with ThreadPoolExecutor(max_workers=settings.USERS_IMPORT_WORKERS, thread_name_prefix='user-import') as executor:
+        futures = [
+            (result, executor.submit(_provision, supabase, limiter, directory, result["data"]))
+            for result in pending
+        ]
+        provisioned = []
+        for result, future in futures:
+            try:
+                result["supabase_user_id"] = future.result()
+                provisioned.append(result)
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+
+    profiles = [
+        UserProfile(
+            supabase_user_id=result["supabase_user_id"],
+            email=result["data"]['email'],
+            company=result["data"]['company'],
+            role=result["data"]['role'],
+            can_view_reports=result["data"].get('can_view_reports', True),
+            can_view_user_management=result["data"].get('can_view_user_management', False),
+        )
+        for result in provisioned
+    ]
+    UserProfile.objects.bulk_create(profiles, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+    # Conflicting rows are dropped silently: a row is ours only if the stored
+    # profile has its account, email and creation time. Any other one (a
+    # concurrent import, or an account already linked to another profile)
+    # is reported as skipped and its profile left alone.
+    inserted = {
+        (supabase_user_id, email, created_at): profile_id
+        for supabase_user_id, email, created_at, profile_id in (
+            UserProfile.objects
+            .filter(supabase_user_id__in=[profile.supabase_user_id for profile in profiles])
+            .values_list('supabase_user_id', 'email', 'created_at', 'id')
+        )
+    }
+    created = []
+    for result, profile in zip(provisioned, profiles):
+        profile_id = inserted.get((profile.supabase_user_id, profile.email, profile.created_at))
+        if profile_id is None:
+            result["status"] = "skipped"
+            continue
+        result.update(status="created", id=profile_id)
+        created.append(result)
+        # bulk_create sends no post_save: drop principals resolved before the profile existed
+        invalidate_principal(result["supabase_user_id"])
+
+    failed = _upsert_profiles(supabase, [
+        {'id': result["supabase_user_id"], 'company': result["data"]['company'], 'role': result["data"]['role']}
+        for result in created
+    ])
+    if failed:
+        # Undo the local profile so importing the row again retries it (reusing the account)
+        UserProfile.objects.filter(supabase_user_id__in=list(failed)).delete()
+        for result in created:
+            if result["supabase_user_id"] in failed:
+                del result["id"]
+                result.update(
+                    status="failed",
+                    error=f"Supabase profile not written: {failed[result['supabase_user_id']]}",
+                )
+
+    for result in provisioned:
+        del result["supabase_user_id"]
+    return results
+
+
+IMPORT_STATUSES = ("created", "skipped", "invalid", "failed")
+UPDATE_STATUSES = ("updated", "partial", "not_found", "invalid")
+
+
+def report(results, statuses=IMPORT_STATUSES):
+    """Response body: totals per status and one entry per row."""
+    rows = [{name: value for name, value in result.items() if name != 'data'} for result in results]
+    for row in rows:
+        if row["status"] == "pending":
+            # The request was rejected because of other rows
+            row["status"] = "valid"
+    totals = {status: 0 for status in statuses}
+    for row in rows:
+        if row["status"] in totals:
+            totals[row["status"]] += 1
+    return {**totals, "results": rows}
+
+
+def parse_changes(data):
+    """
+    Change set of a bulk update: a list of {"id", <fields>} (or the same
+    under "users"), or {"ids": [...], "changes": {<fields>}} to apply one
+    change to many users. Raises InvalidRows.
+    """
+    if isinstance(data, dict) and 'ids' in data:
+        ids, changes = data.get('ids'), data.get('changes')
+        if not isinstance(ids, list) or not isinstance(changes, dict):
+            raise InvalidRows("'ids' must be a list and 'changes' an object")
+        return [{**changes, 'id': user_id} for user_id in ids]
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list):
+        raise InvalidRows("Expected a list of users or {'ids': [...], 'changes': {...}}")
+    return data
+
+
+def validate_changes(rows):
+    """Per-row results with status "invalid" (with "errors") or "pending" (with "data")."""
+    results = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            results.append({"row": number, "status": "invalid", "errors": {"row": ["Expected an object"]}})
+            continue
+        user_id = row.get('id')
+        result = {"row": number, "id": user_id}
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            result.update(status="invalid", errors={"id": ["A user id is required"]})
+        elif user_id in seen:
+            result.update(status="invalid", errors={"id": ["Duplicate user in this request"]})
+        else:
+            serializer = UpdateUserSerializer(data=row)
+            if serializer.is_valid():
+                result.update(status="pending", data=serializer.validated_data)
+            else:
+                result.update(status="invalid", errors=serializer.errors)
+            seen.add(user_id)
+        results.append(result)
+    return results
+
+
+def update_users(results):
+    """
+    Apply the "pending" rows of `validate_changes` in one transaction.
+    Rows are marked "updated", "not_found" for unknown ids, or "partial"
+    (with "error") when the change was saved but its Supabase profile
+    could not be updated; sending the change again retries it.
+    """
+    pending = [result for result in results if result["status"] == "pending"]
+    fields = sorted({name for result in pending for name in result["data"]})
+
+    with transaction.atomic():
+        users = UserProfile.objects.select_for_update().in_bulk([result["id"] for result in pending])
+        # bulk_update skips auto_now: updated_at is what the user list ETag follows
+        now = timezone.now()
+        updated = []
+        for result in pending:
+            user = users.get(result["id"])
+            if user is None:
+                result["status"] = "not_found"
+                continue
+            for name, value in result["data"].items():
+                setattr(user, name, value)
+            user.updated_at = now
+            result["status"] = "updated"
+            updated.append((result, user))
+        UserProfile.objects.bulk_update([user for _, user in updated], fields + ['updated_at'], batch_size=BATCH_SIZE)
+
+    # bulk_update sends no post_save: drop the cached principals ourselves
+    for _, user in updated:
+        invalidate_principal(user.supabase_user_id)
+
+    # After commit: no row lock is held while Supabase is called
+    profiles = [
+        {'id': user.supabase_user_id, 'company': user.company, 'role': user.role}
+        for result, user in updated
+        if {'company', 'role'} & set(result["data"])
+    ]
+    if profiles:
+        try:
+            failed = _upsert_profiles(get_supabase_admin_client(), profiles)
+        except Exception as e:
+            logger.warning("Could not update Supabase profiles: %s", e)
+            failed = {profile['id']: str(e) for profile in profiles}
+        for result, user in updated:
+            if user.supabase_user_id in failed:
+                result.update(
+                    status="partial",
+                    error=f"Saved, but the Supabase profile was not updated: {failed[user.supabase_user_id]}",
+                )
+    return [user for _, user in updated]
+
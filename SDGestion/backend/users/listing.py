@@ -0,0 +1,91 @@
+"""
+Filtered, keyset-paginated user list (`GET api/users/`).
+
+Users are listed newest first on (created_at, id). The cursor carries
+the position of the last user of the previous page, so every page is
+one range scan of the matching composite index (see UserProfile.Meta)
+and a deep page costs the same as the first.
+"""
+from datetime import datetime
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from common.cursors import InvalidCursor, decode_cursor, encode_cursor
+
+from .models import UserProfile
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+BOOLEANS = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def parse_filters(params):
+    """
+    Filters from query params: `company`, `role`, `is_active`
+    (true/false) and `email` (case-insensitive prefix). Raises
+    InvalidFilter.
+    """
+    filters = {}
+    company = params.get('company')
+    if company:
+        if company not in dict(UserProfile.COMPANY_CHOICES):
+            raise InvalidFilter(f"Unknown company '{company}'")
+        filters['company'] = company
+    role = params.get('role')
+    if role:
+        if role not in dict(UserProfile.ROLE_CHOICES):
+            raise InvalidFilter(f"Unknown role '{role}'")
+        filters['role'] = role
+    is_active = params.get('is_active')
+    if is_active:
+        if is_active.lower() not in BOOLEANS:
+            raise InvalidFilter("'is_active' must be true or false")
+        filters['is_active'] = BOOLEANS[is_active.lower()]
+    email = params.get('email', '').strip()
+    if email:
+        filters['email'] = email.lower()
+    return filters
+
+
+def filter_users(filters):
+    users = UserProfile.objects.all()
+    if 'email' in filters:
+        # LIKE 'x%' on Lower(email): served on Postgres by users_email_lower_like_idx (text_pattern_ops)
+        users = users.annotate(email_lower=Lower('email')).filter(email_lower__startswith=filters['email'])
+    return users.filter(**{name: value for name, value in filters.items() if name != 'email'})
+
+
+def list_users_page(filters, page_size, cursor=None):
+    """
+    One page of the users matching `filters`, newest first.
+
+    `cursor` is the one returned with the previous page; it only applies
+    to the filters it was issued for. Returns the users and the cursor of
+    the next page (None on the last one). Raises InvalidCursor.
+    """
+    users = filter_users(filters).order_by('-created_at', '-id')
+    if cursor:
+        data = decode_cursor(cursor)
+        if data.get('filters') != filters:
+            raise InvalidCursor('Cursor does not belong to these filters')
+        try:
+            created_at = datetime.fromisoformat(data['created_at'])
+            last_id = int(data['id'])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        users = users.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+
+    page = list(users[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor({
+            'filters': filters,
+            'created_at': page[-1].created_at.isoformat(),
+            'id': page[-1].id,
+        })
+    return page, next_cursor
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+# LIKE 'prefix%' can only use a btree index with the pattern operator class
+# under a non-C collation. Postgres only, so it is not declared on the model.
+
+
+def add_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS users_email_lower_like_idx '
+            'ON users_userprofile ((LOWER(email)) text_pattern_ops)'
+        )
+
+
+def remove_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS users_email_lower_like_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
@@ -38,6 +39,15 @@ class UserProfile(models.Model):
     class Meta:
         db_table = 'users_userprofile'
         ordering = ['-created_at']
+        # Keyset pagination of the user list (newest first) with its filters
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='users_created_idx'),
+            models.Index(fields=['company', 'role', '-created_at', '-id'], name='users_company_role_idx'),
+            models.Index(fields=['role', '-created_at', '-id'], name='users_role_created_idx'),
+            # Lower(email) equality (imports); the email prefix filter uses the
+            # Postgres-only text_pattern_ops index of migration 0003
+            models.Index(Lower('email'), name='users_email_lower_idx'),
+        ]
     
     def __str__(self):
         return f"{self.email} ({self.role} - {self.company})"
@@ -33,6 +33,26 @@ class CreateUserSerializer(serializers.Serializer):
     
     def validate_email(self, value):
         """Check if email already exists"""
-        if UserProfile.objects.filter(email=value).exists():
+        # Bulk imports look the emails up once (lowercased) and pass them in
+        existing = self.context.get('existing_emails')
+        exists = value.lower() in existing if existing is not None else UserProfile.objects.filter(email__iexact=value).exists()
+        if exists:
             raise serializers.ValidationError("User with this email already exists")
         return value
+
+
+class UpdateUserSerializer(serializers.Serializer):
+    """Serializer for the fields an admin can change on existing users"""
+    company = serializers.ChoiceField(choices=UserProfile.COMPANY_CHOICES, required=False)
+    role = serializers.ChoiceField(choices=UserProfile.ROLE_CHOICES, required=False)
+    can_view_reports = serializers.BooleanField(required=False)
+    can_view_user_management = serializers.BooleanField(required=False)
+    is_active = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        unknown = set(self.initial_data) - set(self.fields) - {'id'}
+        if unknown:
+            raise serializers.ValidationError(f"Fields cannot be changed: {', '.join(sorted(unknown))}")
+        if not attrs:
+            raise serializers.ValidationError("No changes given")
+        return attrs
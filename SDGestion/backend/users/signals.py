@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from authentication.principals import invalidate_principal
+
+from .models import UserProfile
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    """Drop the cached principal so the next request sees the new role/permissions"""
+    # After commit: until then other requests still read the old row
+    supabase_user_id = instance.supabase_user_id
+    transaction.on_commit(lambda: invalidate_principal(supabase_user_id))
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import UserListCreateView, UserDetailView, CurrentUserPermissionsView
+from .views import UserListCreateView, UserImportView, UserBulkUpdateView, UserDetailView, CurrentUserPermissionsView
 
 urlpatterns = [
     path('', UserListCreateView.as_view(), name='user-list-create'),
+    path('import/', UserImportView.as_view(), name='user-import'),
+    path('bulk/', UserBulkUpdateView.as_view(), name='user-bulk-update'),
     path('<int:user_id>/', UserDetailView.as_view(), name='user-detail'),
     path('me/permissions/', CurrentUserPermissionsView.as_view(), name='current-user-permissions'),
 ]
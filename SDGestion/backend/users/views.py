@@ -1,14 +1,26 @@
+import hashlib
+import logging
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
-from supabase import create_client
-import os
 
+from common.clients import get_supabase_client, get_supabase_admin_client
+from common.conditional import not_modified, set_validators
+from common.cursors import InvalidCursor
+
+from .bulk import (
+    UPDATE_STATUSES, InvalidRows, import_users, parse_changes, parse_rows, report,
+    update_users, validate_changes, validate_rows,
+)
+from .listing import InvalidFilter, list_users_page, parse_filters
 from .models import UserProfile
 from .serializers import UserProfileSerializer, CreateUserSerializer
 
+logger = logging.getLogger(__name__)
+
 
 class IsAdmin(IsAuthenticated):
     """
@@ -31,10 +43,45 @@ class UserListCreateView(APIView):
     permission_classes = [IsAdmin]
     
     def get(self, request):
-        """List all users"""
-        users = UserProfile.objects.all()
-        serializer = UserProfileSerializer(users, many=True)
-        return Response(serializer.data)
+        """
+        List users, newest first, one page at a time.
+
+        Query params: `company`, `role`, `is_active`, `email` (prefix),
+        `page_size` (default USERS_PAGE_SIZE, at most USERS_MAX_PAGE_SIZE)
+        and `cursor`. The body is the list of users; the cursor of the
+        next page is in the X-Next-Cursor and Link (rel="next") headers.
+        """
+        try:
+            filters = parse_filters(request.query_params)
+            page_size = int(request.query_params.get('page_size', settings.USERS_PAGE_SIZE))
+        except InvalidFilter as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"error": "'page_size' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= page_size <= settings.USERS_MAX_PAGE_SIZE:
+            return Response({"error": f"'page_size' must be between 1 and {settings.USERS_MAX_PAGE_SIZE}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            users, next_cursor = list_users_page(filters, page_size, request.query_params.get('cursor'))
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Writes bump updated_at; the query is part of the tag so pages never share one
+        version = hashlib.sha256(request.get_full_path().encode())
+        for user in users:
+            version.update(f"|{user.id}:{user.updated_at.timestamp()}".encode())
+        version.update(f"|{next_cursor}".encode())
+        etag = f"users-{version.hexdigest()[:32]}"
+        response = not_modified(request, etag)
+        if response is None:
+            response = Response(UserProfileSerializer(users, many=True).data)
+            set_validators(response, etag)
+        if next_cursor:
+            params = request.query_params.copy()
+            params['cursor'] = next_cursor
+            response['X-Next-Cursor'] = next_cursor
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        return response
     
     def post(self, request):
         """Create new user in Supabase and local database"""
@@ -44,19 +91,15 @@ class UserListCreateView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Initialize Supabase Admin client with service role key
-            supabase_url = os.environ.get("SUPABASE_URL")
             # Use service_role key for admin operations (creating users)
-            supabase_service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-            
-            if not supabase_url or not supabase_service_key:
+            if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_ROLE_KEY:
                 return Response(
                     {"error": "Server misconfiguration: Supabase admin credentials missing"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
-            # Create Supabase client with service role key (has admin privileges)
-            supabase = create_client(supabase_url, supabase_service_key)
+            # Shared Supabase client with service role key (has admin privileges)
+            supabase = get_supabase_admin_client()
             
             # Create user in Supabase
             email = serializer.validated_data['email']
@@ -105,6 +148,82 @@ class UserListCreateView(APIView):
             )
 
 
+class UserImportView(APIView):
+    """
+    POST: Create many users at once (Admin only)
+
+    Accepts a JSON array, a CSV `file` upload or a text/csv body (see
+    users/bulk.py). Returns totals and a result per row: created,
+    skipped (already exists), invalid or failed. Nothing is created when
+    a row is invalid.
+    """
+    permission_classes = [IsAdmin]
+
+    def post(self, request):
+        try:
+            rows = parse_rows(request)
+        except InvalidRows as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not rows:
+            return Response({"error": "No users to import"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.USERS_IMPORT_MAX_ROWS:
+            return Response({"error": f"At most {settings.USERS_IMPORT_MAX_ROWS} users per import"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = validate_rows(rows)
+        if any(result["status"] == "invalid" for result in results):
+            return Response(report(results), status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_ROLE_KEY:
+                return Response(
+                    {"error": "Server misconfiguration: Supabase admin credentials missing"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            import_users(results)
+            return Response(report(results))
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to import users: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class UserBulkUpdateView(APIView):
+    """
+    PATCH: Change company, role, permissions or status of many users (Admin only)
+
+    Body: a list of {"id", <fields>} or {"ids": [...], "changes": {...}}.
+    Applied in one transaction; company/role changes are then pushed to
+    the Supabase profiles table in batches, rows whose profile could not
+    be updated are reported as partial. Nothing is changed when a row is
+    invalid.
+    """
+    permission_classes = [IsAdmin]
+
+    def patch(self, request):
+        try:
+            rows = parse_changes(request.data)
+        except InvalidRows as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not rows:
+            return Response({"error": "No users to update"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.USERS_BULK_UPDATE_MAX_ROWS:
+            return Response({"error": f"At most {settings.USERS_BULK_UPDATE_MAX_ROWS} users per update"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = validate_changes(rows)
+        if any(result["status"] == "invalid" for result in results):
+            return Response(report(results, UPDATE_STATUSES), status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            update_users(results)
+            return Response(report(results, UPDATE_STATUSES))
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to update users: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class UserDetailView(APIView):
     """
     GET: Get user details (Admin only)
@@ -142,22 +261,23 @@ class UserDetailView(APIView):
             if 'is_active' in request.data:
                 user.is_active = request.data['is_active']
             
-            user.save()
-            
-            # Also update Supabase profiles table
-            try:
-                supabase_url = os.environ.get("SUPABASE_URL")
-                supabase_key = os.environ.get("SUPABASE_KEY")
-                
-                if supabase_url and supabase_key:
-                    supabase = create_client(supabase_url, supabase_key)
-                    
+            # Supabase profiles first, outside any transaction: when it fails nothing
+            # is saved, so the two never disagree. The save then drops the cached
+            # principals once it commits (users/signals.py).
+            if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+                try:
+                    supabase = get_supabase_client()
                     supabase.table('profiles').update({
                         'company': user.company,
                         'role': user.role,
                     }).eq('id', user.supabase_user_id).execute()
-            except Exception as e:
-                print(f"Warning: Could not update Supabase profile: {e}")
+                except Exception as e:
+                    logger.warning("Could not update Supabase profile of user %s: %s", user.id, e)
+                    return Response(
+                        {"error": f"Failed to update Supabase profile: {str(e)}"},
+                        status=status.HTTP_502_BAD_GATEWAY
+                    )
+            user.save()
             
             serializer = UserProfileSerializer(user)
             return Response(serializer.data)
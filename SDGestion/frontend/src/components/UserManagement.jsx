@@ -6,14 +6,27 @@ export default function UserManagement({ session }) {
     const [error, setError] = useState(null)
     const [showCreateModal, setShowCreateModal] = useState(false)
     const [editingUser, setEditingUser] = useState(null)
+    const [filters, setFilters] = useState({ company: '', role: '', is_active: '', email: '' })
+    const [nextCursor, setNextCursor] = useState(null)
+    const [loadingMore, setLoadingMore] = useState(false)
 
     useEffect(() => {
-        fetchUsers()
-    }, [])
-
-    const fetchUsers = async () => {
+        // Debounce typing in the email search
+        const timer = setTimeout(() => fetchUsers(), filters.email ? 300 : 0)
+        return () => clearTimeout(timer)
+    }, [filters])
+
+    // Filtering happens server side; the list comes one page at a time (X-Next-Cursor)
+    const fetchUsers = async (cursor = null) => {
+        if (cursor) setLoadingMore(true)
         try {
-            const res = await fetch('http://localhost:8000/api/users/', {
+            const params = new URLSearchParams()
+            Object.entries(filters).forEach(([name, value]) => {
+                if (value) params.set(name, value)
+            })
+            if (cursor) params.set('cursor', cursor)
+
+            const res = await fetch(`http://localhost:8000/api/users/?${params}`, {
                 headers: {
                     'Authorization': `Bearer ${session.access_token}`
                 }
@@ -25,11 +38,14 @@ export default function UserManagement({ session }) {
             }
 
             const data = await res.json()
-            setUsers(data)
+            setUsers(cursor ? prev => [...prev, ...data] : data)
+            setNextCursor(res.headers.get('X-Next-Cursor'))
+            setError(null)
         } catch (err) {
             setError(err.message)
         } finally {
             setLoading(false)
+            setLoadingMore(false)
         }
     }
 
@@ -103,6 +119,44 @@ export default function UserManagement({ session }) {
                 </div>
             )}
 
+            <div className="mb-6 grid grid-cols-1 sm:grid-cols-4 gap-4">
+                <input
+                    type="text"
+                    placeholder="Search by email"
+                    value={filters.email}
+                    onChange={(e) => setFilters({ ...filters, email: e.target.value })}
+                    className="w-full px-4 py-2 bg-slate-800 border border-slate-700 rounded-lg text-white focus:outline-none focus:border-blue-500"
+                />
+                <select
+                    value={filters.company}
+                    onChange={(e) => setFilters({ ...filters, company: e.target.value })}
+                    className="w-full px-4 py-2 bg-slate-800 border border-slate-700 rounded-lg text-white focus:outline-none focus:border-blue-500"
+                >
+                    <option value="">All companies</option>
+                    <option value="Dko">Dko</option>
+                    <option value="Mv">Mv</option>
+                </select>
+                <select
+                    value={filters.role}
+                    onChange={(e) => setFilters({ ...filters, role: e.target.value })}
+                    className="w-full px-4 py-2 bg-slate-800 border border-slate-700 rounded-lg text-white focus:outline-none focus:border-blue-500"
+                >
+                    <option value="">All roles</option>
+                    <option value="Admin">Admin</option>
+                    <option value="Comercial">Comercial</option>
+                    <option value="Tienda">Tienda</option>
+                </select>
+                <select
+                    value={filters.is_active}
+                    onChange={(e) => setFilters({ ...filters, is_active: e.target.value })}
+                    className="w-full px-4 py-2 bg-slate-800 border border-slate-700 rounded-lg text-white focus:outline-none focus:border-blue-500"
+                >
+                    <option value="">All statuses</option>
+                    <option value="true">Active</option>
+                    <option value="false">Inactive</option>
+                </select>
+            </div>
+
             {loading ? (
                 <div className="text-center py-12">
                     <div className="inline-block animate-spin rounded-full h-8 w-8 border-b-2 border-blue-500"></div>
@@ -198,6 +252,17 @@ export default function UserManagement({ session }) {
                             </tbody>
                         </table>
                     </div>
+                    {nextCursor && (
+                        <div className="p-4 border-t border-slate-800/50 text-center">
+                            <button
+                                onClick={() => fetchUsers(nextCursor)}
+                                disabled={loadingMore}
+                                className="px-4 py-2 bg-slate-800 hover:bg-slate-700 text-slate-200 text-sm font-medium rounded-lg transition-colors disabled:opacity-50"
+                            >
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             )}
 